@@ -4,23 +4,85 @@
 Данные и изображения хранятся локально
 """
 
+import base64
 import csv
 import os
 import json
-from flask import Flask, render_template_string, send_from_directory
+import mimetypes
+import time
+from flask import Flask, Response, abort, g, jsonify, redirect, request, send_from_directory
+import numpy as np
+
+import battle
+import db
+import metrics
+from assets import AssetRegistry
+from graph import EVOLUTION_FILE, EvolutionGraph
+from images import ImageCache, ImageCatalog, SpriteAtlas, is_digest
+from monitoring import CONTENT_TYPE as METRICS_CONTENT_TYPE, Monitor
+from optimizer import DEFAULT_SLOTS, OBJECTIVES, SquadOptimizer
+from pages import JSON, PageCache
+from store import UnitStore
 
 app = Flask(__name__)
+# JSON API отдаёт кириллицу как есть и сохраняет порядок колонок CSV
+app.json.ensure_ascii = False
+app.json.sort_keys = False
 
 # Папка с изображениями
 IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'images')
+# UNITS_CSV=other.csv — другой CSV (например, синтетический набор для bench.py)
+CSV_FILE = os.environ.get('UNITS_CSV') or os.path.join(os.path.dirname(__file__), 'empire_units.csv')
+# UNITS_DB=units.db — читать юнитов всех рас из SQLite вместо CSV
+UNITS_DB = os.environ.get('UNITS_DB')
+# METRICS_DIR=/tmp/disciples-metrics — общая папка метрик для воркеров gunicorn
+# (gunicorn.conf.py без неё создаёт временную)
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+monitor = Monitor(METRICS_DIR)
+
+# UNIT_METRICS=Урон/ход,Эфф. HP — только эти производные показатели (по умолчанию все)
+UNIT_METRICS = metrics.METRICS
+if os.environ.get('UNIT_METRICS'):
+    UNIT_METRICS = metrics.select(n.strip() for n in os.environ['UNIT_METRICS'].split(','))
 
 
 @app.route("/images/<path:filename>")
 def serve_image(filename):
-    """Отдаём локальные изображения"""
+    """
+    Отдаём локальные изображения.
+    /images/<хэш>/Ангел.png — неизменяемый адрес: кэшируется браузером на год,
+    байты берутся из LRU в памяти. Старые адреса без хэша тоже работают.
+    """
+    digest, _, rel_path = filename.partition('/')
+    if rel_path and is_digest(digest):
+        path = images.resolve(digest, rel_path)
+        if path is None:
+            # Картинка изменилась — отправляем на актуальный адрес
+            current = images.url(rel_path)
+            if current == f"/images/{rel_path}":
+                abort(404)
+            return redirect(current)
+        if request.if_none_match.contains(digest):
+            resp = Response(status=304)
+        else:
+            mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+            resp = Response(hot_images.get(filename, path), mimetype=mimetype)
+        resp.set_etag(digest)
+        resp.headers['Cache-Control'] = IMMUTABLE_CACHE
+        return resp
     return send_from_directory(IMAGES_DIR, filename)
 
 
+@app.route("/assets/<filename>")
+def serve_asset(filename):
+    """CSS и JS с хэшем в имени: неизменяемы, кэшируются на год"""
+    page = assets.get(filename)
+    if page is None:
+        abort(404)
+    return page.response(cache_control=IMMUTABLE_CACHE)
+
+
 def load_csv_data(filename="empire_units.csv"):
     """Загружаем данные из локального CSV"""
     filepath = os.path.join(os.path.dirname(__file__), filename)
@@ -38,6 +100,64 @@ def load_csv_data(filename="empire_units.csv"):
     return columns, units
 
 
+# Картинки с хэшами содержимого и собранными превью (python thumbnails.py)
+images = ImageCatalog(IMAGES_DIR)
+app.jinja_env.globals['img_attrs'] = images.img_attrs
+
+# CSS и JS отдаются отдельными файлами с хэшем в имени
+assets = AssetRegistry()
+app.jinja_env.globals['asset_url'] = assets.url
+
+# Иконки таблицы и древа берутся из одного спрайт-атласа (python atlas.py)
+atlas = SpriteAtlas(images)
+app.jinja_env.globals['icon'] = atlas.icon
+
+
+def refresh_sprites():
+    """CSS с координатами атласа — отдельный ресурс, меняется вместе с атласом"""
+    atlas.refresh()
+    if atlas.css():
+        assets.add('sprites.css', atlas.css())
+    else:
+        assets.remove('sprites.css')
+
+
+# Горячие картинки отдаём из памяти, не трогая диск
+hot_images = ImageCache()
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+
+# Древо апгрейдов (evolution.json) перечитывается вместе с данными
+evolution = EvolutionGraph.load()
+
+
+def load_data():
+    """
+    Загрузка для хранилища: CSV плюс актуальный список картинок.
+    image_url переписывается в адрес с хэшем, так что шаблоны и JSON
+    сразу ссылаются на неизменяемые адреса.
+    """
+    global evolution
+    images.refresh()
+    refresh_sprites()
+    evolution = EvolutionGraph.load()
+    columns, units = db.load_units(UNITS_DB) if UNITS_DB else load_csv_data(CSV_FILE)
+    for unit in units:
+        unit['image_url'] = images.rewrite(unit.get('image_url'))
+    return columns, units
+
+
+# Данные загружаются один раз и перечитываются только при изменении CSV/базы,
+# древа апгрейдов или картинок (иначе заменённая картинка отдавалась бы по старому хэшу)
+if UNITS_DB:
+    store = UnitStore(load_data, UNITS_DB,
+                      watch=db.watch_paths(UNITS_DB)[1:] + (EVOLUTION_FILE, images.stat_key),
+                      metrics=UNIT_METRICS)
+else:
+    store = UnitStore(load_data, CSV_FILE, watch=(EVOLUTION_FILE, images.stat_key), metrics=UNIT_METRICS)
+
+
 CSS = """
 * { margin: 0; padding: 0; box-sizing: border-box; }
 
@@ -161,10 +281,15 @@ td {
 tr:hover td { background: #fafafa; }
 tr:last-child td { border-bottom: none; }
 
-.img-cell img {
+/* Виртуальная таблица: прокрутка внутри блока, в DOM только видимые строки */
+.tbl-wrap.virtual { max-height: calc(100vh - 200px); overflow-y: auto; }
+.tbl-wrap.virtual tbody tr { height: 45px; }
+.tbl-wrap.virtual tbody tr.spacer, .tbl-wrap.virtual tbody tr.spacer td { height: auto; padding: 0; border: none; }
+
+.img-cell img, .img-cell .sprite {
     width: 32px; height: 32px;
     border-radius: 3px;
-    background: #f5f5f5;
+    background-color: #f5f5f5;
     object-fit: contain;
     display: block;
 }
@@ -174,6 +299,7 @@ tr:last-child td { border-bottom: none; }
 .dmg { color: #ea580c; font-weight: 600; }
 .armor { color: #16a34a; font-weight: 600; }
 .gold { color: #ca8a04; font-weight: 600; }
+.metric { color: #6b7280; font-variant-numeric: tabular-nums; }
 
 /* TREE */
 .tree-wrap {
@@ -254,10 +380,10 @@ tr:last-child td { border-bottom: none; }
 .unit-card:hover { border-color: #999; }
 .unit-card.sel { background: #1a1a1a; border-color: #1a1a1a; color: #fff; }
 
-.unit-card img {
+.unit-card img, .unit-card .sprite {
     width: 24px; height: 24px;
     border-radius: 2px;
-    background: #f5f5f5;
+    background-color: #f5f5f5;
     object-fit: contain;
 }
 
@@ -267,6 +393,8 @@ tr:last-child td { border-bottom: none; }
 
 .arrow { color: #ccc; font-size: 11px; }
 
+.faction-title { font-size: 15px; font-weight: 600; margin: 8px 0 16px; }
+
 .fork {
     display: flex;
     flex-direction: column;
@@ -403,15 +531,308 @@ footer a:hover { color: #000; }
     .sub { font-size: 11px; margin-bottom: 12px; }
     table { font-size: 11px; min-width: 700px; }
     th, td { padding: 6px; }
-    .img-cell img { width: 28px; height: 28px; }
+    .img-cell img, .img-cell .sprite { width: 28px; height: 28px; }
     .unit-card { padding: 4px 6px; }
-    .unit-card img { width: 20px; height: 20px; }
+    .unit-card img, .unit-card .sprite { width: 20px; height: 20px; }
     .unit-card .n { font-size: 10px; }
     .info-box { padding: 12px; }
     .tree-img { max-width: 220px; min-height: 220px; }
 }
 """
 
+
+TABLE_JS = """
+// Фильтрация: текст строк приводим к нижнему регистру один раз
+let rowTexts = null;
+
+function filter() {
+    const q = document.getElementById('q').value.toLowerCase();
+    if (!rowTexts) {
+        rowTexts = Array.from(document.querySelectorAll('#tbl tbody tr'),
+                              r => [r, r.textContent.toLowerCase()]);
+    }
+    rowTexts.forEach(([r, text]) => {
+        r.style.display = text.includes(q) ? '' : 'none';
+    });
+}
+
+// Сортировка
+let currentSort = { col: -1, dir: 'asc' };
+
+document.querySelectorAll('#tbl th[data-col]').forEach(th => {
+    if (th.dataset.col === '0') return; // Пропускаем колонку с картинкой
+    
+    th.addEventListener('click', () => {
+        const col = parseInt(th.dataset.col);
+        const type = th.dataset.type;
+        
+        // Определяем направление
+        if (currentSort.col === col) {
+            currentSort.dir = currentSort.dir === 'asc' ? 'desc' : 'asc';
+        } else {
+            currentSort.col = col;
+            currentSort.dir = 'asc';
+        }
+        
+        // Обновляем классы заголовков
+        document.querySelectorAll('#tbl th').forEach(h => {
+            h.classList.remove('sorted', 'asc', 'desc');
+        });
+        th.classList.add('sorted', currentSort.dir);
+        
+        // Сортируем строки
+        const tbody = document.querySelector('#tbl tbody');
+        const rows = Array.from(tbody.querySelectorAll('tr'));
+        
+        // Ключи считаем один раз на строку, а не в каждом сравнении.
+        // Числа уже разобраны на сервере и лежат в data-v.
+        const keyed = rows.map(r => {
+            const cell = r.cells[col];
+            let key;
+            if (type === 'num') {
+                key = cell.dataset.v === '' ? null : parseFloat(cell.dataset.v);
+            } else {
+                key = cell.textContent.trim();
+                if (key === '—' || key === '') key = null;
+            }
+            return [key, r];
+        });
+        
+        const sign = currentSort.dir === 'asc' ? 1 : -1;
+        keyed.sort(([a], [b]) => {
+            // Пустые значения всегда в конце
+            if (a === null || b === null) return (a === null) - (b === null);
+            if (type === 'num') return sign * (a - b);
+            return sign * a.localeCompare(b, 'ru');
+        });
+        
+        // Перестраиваем таблицу
+        keyed.forEach(([, row]) => tbody.appendChild(row));
+        
+        // Обновляем инфо
+        const colName = th.textContent;
+        document.getElementById('sort-info').textContent = 
+            `Сортировка: ${colName} (${currentSort.dir === 'asc' ? '↑' : '↓'})`;
+    });
+});
+"""
+
+TREE_JS = """
+// На странице только короткий индекс D (картинка и английское имя),
+// полные характеристики запрашиваются у /api/units/<имя>.json при выборе юнита
+const details = new Map();
+
+function fetchUnit(n) {
+    if (!details.has(n)) {
+        const req = fetch(`/api/units/${encodeURIComponent(n)}.json`)
+            .then(r => r.ok ? r.json() : Promise.reject(r.status))
+            .catch(() => { details.delete(n); return null; });
+        details.set(n, req);
+    }
+    return details.get(n);
+}
+
+function showInfo(n, u) {
+    document.getElementById('empty').style.display = 'none';
+    document.getElementById('info').classList.add('show');
+    
+    document.getElementById('i-name').textContent = n;
+    document.getElementById('i-sub').textContent = u.name_en || '';
+    
+    document.getElementById('i-hp').textContent = u['Здоровье'] || '—';
+    document.getElementById('i-armor').textContent = u['Броня'] || '—';
+    document.getElementById('i-dmg').textContent = u['Урон'] || '—';
+    document.getElementById('i-cost').textContent = u['Цена'] || '—';
+    
+    document.getElementById('i-lvl').textContent = u['Уровень'] || '—';
+    document.getElementById('i-atk').textContent = u['Атака'] || '—';
+    document.getElementById('i-init').textContent = u['Инициатива'] || '—';
+    document.getElementById('i-src').textContent = u['Источник'] || '—';
+    document.getElementById('i-hit').textContent = u['Шанс попадания'] || '—';
+    document.getElementById('i-reach').textContent = u['Дальность'] || '—';
+    document.getElementById('i-tgt').textContent = u['Кол-во целей'] || '—';
+    document.getElementById('i-ward').textContent = u['Защита'] || '—';
+    document.getElementById('i-imm').textContent = u['Иммунитет'] || '—';
+    document.getElementById('i-xpk').textContent = u['Опыт за убийство'] || '—';
+    document.getElementById('i-xpn').textContent = u['Опыт до апгрейда'] || '—';
+    
+    document.getElementById('i-link').href = u.url || '#';
+}
+
+let selected = null;
+
+document.querySelectorAll('.unit-card').forEach(c => {
+    const n = c.dataset.u;
+    
+    // Подгружаем заранее, пока курсор над карточкой
+    c.addEventListener('mouseenter', () => { if (D[n]) fetchUnit(n); });
+    
+    c.addEventListener('click', () => {
+        document.querySelectorAll('.unit-card').forEach(x => x.classList.remove('sel'));
+        c.classList.add('sel');
+        
+        const brief = D[n];
+        if (!brief) return;
+        selected = n;
+        
+        // Центральное изображение — сразу, из индекса
+        const imgBox = document.getElementById('img-box');
+        const img = document.getElementById('i-img');
+        const placeholder = imgBox.querySelector('.placeholder');
+        
+        if (brief.image_url) {
+            img.src = brief.image_url;
+            img.style.display = 'block';
+            if (placeholder) placeholder.style.display = 'none';
+        }
+        
+        // Панель данных — когда придут характеристики
+        fetchUnit(n).then(u => {
+            if (u && selected === n) showInfo(n, u);
+        });
+    });
+});
+"""
+TABLE_VIRTUAL_JS = """
+// Виртуальная таблица для больших наборов данных:
+// в DOM только видимые строки, данные подгружаются из /api/units по мере прокрутки,
+// сортировка и поиск выполняются на сервере
+(function () {
+    const ROW_H = 45, PAGE = 200, OVERSCAN = 10;
+    const COLS = [
+        ['thumb_url', 'img-cell'], ['name', 'name-cell'], ['Уровень', ''],
+        ['Здоровье', 'hp'], ['Броня', 'armor'], ['Атака', ''], ['Урон', 'dmg'],
+        ['Инициатива', ''], ['Источник', ''], ['Шанс попадания', ''], ['Дальность', ''],
+        ['Кол-во целей', ''], ['Защита', ''], ['Иммунитет', ''], ['Цена', 'gold'],
+        ['Опыт за убийство', ''], ['Опыт до апгрейда', ''],
+        // Производные показатели — те, что сервер вывел в шапку таблицы
+        ...Array.from(document.querySelectorAll('#tbl th[data-metric]'),
+                      th => [th.dataset.field, 'metric']),
+    ];
+    const FIELDS = COLS.map(c => c[0]).join(',');
+
+    const wrap = document.querySelector('.tbl-wrap');
+    const tbody = document.querySelector('#tbl tbody');
+    const state = { sort: '', order: 'asc', q: '' };
+    let total = VIRTUAL_TOTAL, rows = [], pending = new Set(), generation = 0;
+
+    function pageUrl(page) {
+        const p = new URLSearchParams({ offset: page * PAGE, limit: PAGE, fields: FIELDS });
+        if (state.sort) { p.set('sort', state.sort); p.set('order', state.order); }
+        if (state.q) p.set('q', state.q);
+        return '/api/units?' + p;
+    }
+
+    function load(page) {
+        if (pending.has(page)) return;
+        pending.add(page);
+        const gen = generation;
+        fetch(pageUrl(page)).then(r => r.json()).then(data => {
+            if (gen !== generation) return;  // запрос устарел: сменили сортировку или поиск
+            total = data.total;
+            data.units.forEach((u, i) => { rows[page * PAGE + i] = u; });
+            document.getElementById('sub').textContent = `${total} существ`;
+            render();
+        });
+    }
+
+    function cell(u, [field, cls]) {
+        const td = document.createElement('td');
+        if (cls) td.className = cls;
+        if (field === 'thumb_url') {
+            if (u.thumb_url) {
+                const img = document.createElement('img');
+                img.src = u.thumb_url;
+                img.alt = '';
+                td.appendChild(img);
+            }
+        } else {
+            const v = u[field];
+            td.textContent = v === null || v === undefined || v === '' ? '—' : v;
+        }
+        return td;
+    }
+
+    function spacer(height) {
+        const tr = document.createElement('tr');
+        tr.className = 'spacer';
+        const td = document.createElement('td');
+        td.colSpan = COLS.length;
+        td.style.height = height + 'px';
+        tr.appendChild(td);
+        return tr;
+    }
+
+    function render() {
+        const first = Math.max(0, Math.floor(wrap.scrollTop / ROW_H) - OVERSCAN);
+        const last = Math.min(total, Math.ceil((wrap.scrollTop + wrap.clientHeight) / ROW_H) + OVERSCAN);
+        const frag = document.createDocumentFragment();
+        frag.appendChild(spacer(first * ROW_H));
+        for (let i = first; i < last; i++) {
+            const u = rows[i];
+            const tr = document.createElement('tr');
+            if (u) {
+                COLS.forEach(c => tr.appendChild(cell(u, c)));
+            } else {
+                load(Math.floor(i / PAGE));
+                const td = document.createElement('td');
+                td.colSpan = COLS.length;
+                tr.appendChild(td);
+            }
+            frag.appendChild(tr);
+        }
+        frag.appendChild(spacer(Math.max(0, total - last) * ROW_H));
+        tbody.replaceChildren(frag);
+    }
+
+    function reset() {
+        generation++;
+        rows = [];
+        pending.clear();
+        wrap.scrollTop = 0;
+        render();
+    }
+
+    let ticking = false;
+    wrap.addEventListener('scroll', () => {
+        if (ticking) return;
+        ticking = true;
+        requestAnimationFrame(() => { ticking = false; render(); });
+    });
+
+    document.querySelectorAll('#tbl th[data-field]').forEach(th => {
+        th.addEventListener('click', () => {
+            const field = th.dataset.field;
+            state.order = state.sort === field && state.order === 'asc' ? 'desc' : 'asc';
+            state.sort = field;
+            document.querySelectorAll('#tbl th').forEach(h => h.classList.remove('sorted', 'asc', 'desc'));
+            th.classList.add('sorted', state.order);
+            document.getElementById('sort-info').textContent =
+                `Сортировка: ${th.textContent} (${state.order === 'asc' ? '↑' : '↓'})`;
+            reset();
+        });
+    });
+
+    // Поиск — через серверный индекс, с небольшой задержкой между нажатиями
+    let timer = null;
+    window.filter = function () {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            state.q = document.getElementById('q').value.trim();
+            reset();
+        }, 150);
+    };
+
+    render();
+})();
+"""
+
+assets.add('app.css', CSS)
+assets.add('table.js', TABLE_JS)
+assets.add('table-virtual.js', TABLE_VIRTUAL_JS)
+assets.add('tree.js', TREE_JS)
+
+
 TABLE_HTML = """
 <!DOCTYPE html>
 <html lang="ru">
@@ -419,7 +840,8 @@ TABLE_HTML = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Империя — Disciples II</title>
-    <style>""" + CSS + """</style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+    {% if asset_url('sprites.css') %}<link rel="stylesheet" href="{{ asset_url('sprites.css') }}">{% endif %}
 </head>
 <body>
     <nav>
@@ -432,7 +854,7 @@ TABLE_HTML = """
     
     <main>
         <h1>Юниты Империи</h1>
-        <p class="sub">{{ units|length }} существ</p>
+        <p class="sub" id="sub">{{ units|length }} существ</p>
         
         <div class="controls">
             <div class="search">
@@ -441,51 +863,60 @@ TABLE_HTML = """
             <div class="sort-info" id="sort-info">Нажмите на заголовок для сортировки</div>
         </div>
         
-        <div class="tbl-wrap">
+        <div class="tbl-wrap{% if virtual %} virtual{% endif %}">
             <table id="tbl">
                 <thead>
                     <tr>
                         <th data-col="0"></th>
-                        <th data-col="1" data-type="str">Имя</th>
-                        <th data-col="2" data-type="num">Ур.</th>
-                        <th data-col="3" data-type="num">HP</th>
-                        <th data-col="4" data-type="num">Броня</th>
-                        <th data-col="5" data-type="str">Атака</th>
-                        <th data-col="6" data-type="num">Урон</th>
-                        <th data-col="7" data-type="num">Иниц.</th>
-                        <th data-col="8" data-type="str">Источник</th>
-                        <th data-col="9" data-type="str">Шанс</th>
-                        <th data-col="10" data-type="str">Дальн.</th>
-                        <th data-col="11" data-type="num">Целей</th>
-                        <th data-col="12" data-type="str">Защита</th>
-                        <th data-col="13" data-type="str">Иммунитет</th>
-                        <th data-col="14" data-type="num">Цена</th>
-                        <th data-col="15" data-type="num">XP kill</th>
-                        <th data-col="16" data-type="num">XP next</th>
+                        <th data-col="1" data-field="name" data-type="str">Имя</th>
+                        <th data-col="2" data-field="Уровень" data-type="num">Ур.</th>
+                        <th data-col="3" data-field="Здоровье" data-type="num">HP</th>
+                        <th data-col="4" data-field="Броня" data-type="num">Броня</th>
+                        <th data-col="5" data-field="Атака" data-type="str">Атака</th>
+                        <th data-col="6" data-field="Урон" data-type="num">Урон</th>
+                        <th data-col="7" data-field="Инициатива" data-type="num">Иниц.</th>
+                        <th data-col="8" data-field="Источник" data-type="str">Источник</th>
+                        <th data-col="9" data-field="Шанс попадания" data-type="num">Шанс</th>
+                        <th data-col="10" data-field="Дальность" data-type="str">Дальн.</th>
+                        <th data-col="11" data-field="Кол-во целей" data-type="num">Целей</th>
+                        <th data-col="12" data-field="Защита" data-type="str">Защита</th>
+                        <th data-col="13" data-field="Иммунитет" data-type="str">Иммунитет</th>
+                        <th data-col="14" data-field="Цена" data-type="num">Цена</th>
+                        <th data-col="15" data-field="Опыт за убийство" data-type="num">XP kill</th>
+                        <th data-col="16" data-field="Опыт до апгрейда" data-type="num">XP next</th>
+                        {% for m in metrics %}
+                        <th data-col="{{ 17 + loop.index0 }}" data-field="{{ m.name }}" data-type="num" data-metric title="{{ m.description }}">{{ m.name }}</th>
+                        {% endfor %}
                     </tr>
                 </thead>
                 <tbody>
+                    {% if not virtual %}
                     {% for u in units %}
                     <tr>
-                        <td class="img-cell">{% if u.image_url %}<img src="{{ u.image_url }}" alt="">{% endif %}</td>
+                        <td class="img-cell">{{ icon(u.image_url, 32) }}</td>
                         <td class="name-cell">{{ u.name }}</td>
-                        <td>{{ u.get('Уровень', '—') }}</td>
-                        <td class="hp">{{ u.get('Здоровье', '—') }}</td>
-                        <td class="armor">{{ u.get('Броня', '—') }}</td>
+                        {% set i = loop.index0 %}
+                        <td data-v="{{ num['Уровень'][i] }}">{{ u.get('Уровень', '—') }}</td>
+                        <td class="hp" data-v="{{ num['Здоровье'][i] }}">{{ u.get('Здоровье', '—') }}</td>
+                        <td class="armor" data-v="{{ num['Броня'][i] }}">{{ u.get('Броня', '—') }}</td>
                         <td>{{ u.get('Атака', '—') }}</td>
-                        <td class="dmg">{{ u.get('Урон', '—') }}</td>
-                        <td>{{ u.get('Инициатива', '—') }}</td>
+                        <td class="dmg" data-v="{{ num['Урон'][i] }}">{{ u.get('Урон', '—') }}</td>
+                        <td data-v="{{ num['Инициатива'][i] }}">{{ u.get('Инициатива', '—') }}</td>
                         <td>{{ u.get('Источник', '—') }}</td>
-                        <td>{{ u.get('Шанс попадания', '—') }}</td>
+                        <td data-v="{{ num['Шанс попадания'][i] }}">{{ u.get('Шанс попадания', '—') }}</td>
                         <td>{{ u.get('Дальность', '—') }}</td>
-                        <td>{{ u.get('Кол-во целей', '—') }}</td>
+                        <td data-v="{{ num['Кол-во целей'][i] }}">{{ u.get('Кол-во целей', '—') }}</td>
                         <td>{{ u.get('Защита', '—') }}</td>
                         <td>{{ u.get('Иммунитет', '—') }}</td>
-                        <td class="gold">{{ u.get('Цена', '—') }}</td>
-                        <td>{{ u.get('Опыт за убийство', '—') }}</td>
-                        <td>{{ u.get('Опыт до апгрейда', '—') }}</td>
+                        <td class="gold" data-v="{{ num['Цена'][i] }}">{{ u.get('Цена', '—') }}</td>
+                        <td data-v="{{ num['Опыт за убийство'][i] }}">{{ u.get('Опыт за убийство', '—') }}</td>
+                        <td data-v="{{ num['Опыт до апгрейда'][i] }}">{{ u.get('Опыт до апгрейда', '—') }}</td>
+                        {% for m in metrics %}
+                        <td class="metric" data-v="{{ num[m.name][i] }}">{{ num[m.name][i] or '—' }}</td>
+                        {% endfor %}
                     </tr>
                     {% endfor %}
+                    {% endif %}
                 </tbody>
             </table>
         </div>
@@ -493,85 +924,40 @@ TABLE_HTML = """
     
     <footer>Данные: <a href="https://disciples.fandom.com" target="_blank">Disciples Wiki</a></footer>
     
-    <script>
-    // Фильтрация
-    function filter() {
-        const q = document.getElementById('q').value.toLowerCase();
-        document.querySelectorAll('#tbl tbody tr').forEach(r => {
-            r.style.display = r.textContent.toLowerCase().includes(q) ? '' : 'none';
-        });
-    }
-    
-    // Сортировка
-    let currentSort = { col: -1, dir: 'asc' };
-    
-    document.querySelectorAll('#tbl th[data-col]').forEach(th => {
-        if (th.dataset.col === '0') return; // Пропускаем колонку с картинкой
-        
-        th.addEventListener('click', () => {
-            const col = parseInt(th.dataset.col);
-            const type = th.dataset.type;
-            
-            // Определяем направление
-            if (currentSort.col === col) {
-                currentSort.dir = currentSort.dir === 'asc' ? 'desc' : 'asc';
-            } else {
-                currentSort.col = col;
-                currentSort.dir = 'asc';
-            }
-            
-            // Обновляем классы заголовков
-            document.querySelectorAll('#tbl th').forEach(h => {
-                h.classList.remove('sorted', 'asc', 'desc');
-            });
-            th.classList.add('sorted', currentSort.dir);
-            
-            // Сортируем строки
-            const tbody = document.querySelector('#tbl tbody');
-            const rows = Array.from(tbody.querySelectorAll('tr'));
-            
-            rows.sort((a, b) => {
-                let aVal = a.cells[col].textContent.trim();
-                let bVal = b.cells[col].textContent.trim();
-                
-                // Для числовых колонок
-                if (type === 'num') {
-                    // Извлекаем первое число из строки
-                    const aNum = parseFloat(aVal.replace(/[^0-9.-]/g, '')) || 0;
-                    const bNum = parseFloat(bVal.replace(/[^0-9.-]/g, '')) || 0;
-                    return currentSort.dir === 'asc' ? aNum - bNum : bNum - aNum;
-                }
-                
-                // Для строковых колонок
-                if (aVal === '—') aVal = '';
-                if (bVal === '—') bVal = '';
-                return currentSort.dir === 'asc' 
-                    ? aVal.localeCompare(bVal, 'ru') 
-                    : bVal.localeCompare(aVal, 'ru');
-            });
-            
-            // Перестраиваем таблицу
-            rows.forEach(row => tbody.appendChild(row));
-            
-            // Обновляем инфо
-            const colName = th.textContent;
-            document.getElementById('sort-info').textContent = 
-                `Сортировка: ${colName} (${currentSort.dir === 'asc' ? '↑' : '↓'})`;
-        });
-    });
-    </script>
+    {% if virtual %}
+    <script>const VIRTUAL_TOTAL = {{ units|length }};</script>
+    <script src="{{ asset_url('table-virtual.js') }}"></script>
+    {% else %}
+    <script src="{{ asset_url('table.js') }}"></script>
+    {% endif %}
 </body>
 </html>
 """
 
 TREE_HTML = """
+{%- macro card(c) -%}
+<div class="unit-card" data-u="{{ c.name }}">{{ icon(c.image_url, 32) }}<div><div class="n">{{ c.short }}</div><div class="l">{{ c.label }}</div></div></div>
+{%- endmacro -%}
+{%- macro evo_line(items, flat=False) -%}
+<div class="evo-line">
+{%- for item in items %}
+{%- if not loop.first and not flat %}<span class="arrow">→</span>{% endif %}
+{%- if item.fork %}
+<div class="fork">
+{%- for sub in item.fork %}{% if sub|length == 1 and not sub[0].fork %}{{ card(sub[0].card) }}{% else %}{{ evo_line(sub) }}{% endif %}{% endfor -%}
+</div>
+{%- else %}{{ card(item.card) }}{% endif %}
+{%- endfor -%}
+</div>
+{%- endmacro %}
 <!DOCTYPE html>
 <html lang="ru">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Древо — Disciples II</title>
-    <style>""" + CSS + """</style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+    {% if asset_url('sprites.css') %}<link rel="stylesheet" href="{{ asset_url('sprites.css') }}">{% endif %}
 </head>
 <body>
     <nav>
@@ -588,172 +974,15 @@ TREE_HTML = """
         
         <div class="tree-wrap">
             <div class="tree-main">
-                
-                <!-- ВОИНЫ -->
+                {% for f in layout %}
+                {% if layout|length > 1 %}<h2 class="faction-title">{{ f.faction }}</h2>{% endif %}
+                {% for b in f.branches %}
                 <div class="branch">
-                    <div class="branch-title warrior">Воины</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Сквайр">
-                            <img src="{{ m.get('Сквайр', {}).get('image_url', '') }}"><div><div class="n">Сквайр</div><div class="l">Ур.1</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Рыцарь">
-                            <img src="{{ m.get('Рыцарь', {}).get('image_url', '') }}"><div><div class="n">Рыцарь</div><div class="l">Ур.2</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Имперский рыцарь">
-                            <img src="{{ m.get('Имперский рыцарь', {}).get('image_url', '') }}"><div><div class="n">Имп. рыцарь</div><div class="l">Ур.3</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="fork">
-                            <div class="unit-card" data-u="Ангел">
-                                <img src="{{ m.get('Ангел', {}).get('image_url', '') }}"><div><div class="n">Ангел</div><div class="l">Ур.4</div></div>
-                            </div>
-                            <div class="unit-card" data-u="Паладин">
-                                <img src="{{ m.get('Паладин', {}).get('image_url', '') }}"><div><div class="n">Паладин</div><div class="l">Ур.4</div></div>
-                            </div>
-                        </div>
-                    </div>
-                    <div class="evo-line" style="margin-left:160px;">
-                        <span class="arrow">↳</span>
-                        <div class="fork">
-                            <div class="unit-card" data-u="Святой мститель">
-                                <img src="{{ m.get('Святой мститель', {}).get('image_url', '') }}"><div><div class="n">Святой мститель</div><div class="l">Ур.5</div></div>
-                            </div>
-                            <div class="unit-card" data-u="Защитник Веры">
-                                <img src="{{ m.get('Защитник Веры', {}).get('image_url', '') }}"><div><div class="n">Защитник Веры</div><div class="l">Ур.5</div></div>
-                            </div>
-                        </div>
-                    </div>
+                    <div class="branch-title {{ b.class }}">{{ b.title }}</div>
+                    {{ evo_line(b.line, b.flat) }}
                 </div>
-                
-                <!-- ИНКВИЗИЦИЯ -->
-                <div class="branch">
-                    <div class="branch-title warrior">Инквизиция</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Сквайр">
-                            <img src="{{ m.get('Сквайр', {}).get('image_url', '') }}"><div><div class="n">Сквайр</div><div class="l">Ур.1</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Охотник на ведьм">
-                            <img src="{{ m.get('Охотник на ведьм', {}).get('image_url', '') }}"><div><div class="n">Охотник на ведьм</div><div class="l">Ур.2</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Инквизитор">
-                            <img src="{{ m.get('Инквизитор', {}).get('image_url', '') }}"><div><div class="n">Инквизитор</div><div class="l">Ур.3</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Великий инквизитор">
-                            <img src="{{ m.get('Великий инквизитор', {}).get('image_url', '') }}"><div><div class="n">Вел. инквизитор</div><div class="l">Ур.4</div></div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- ЛУЧНИКИ -->
-                <div class="branch">
-                    <div class="branch-title archer">Лучники</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Лучник">
-                            <img src="{{ m.get('Лучник', {}).get('image_url', '') }}"><div><div class="n">Лучник</div><div class="l">Ур.1</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Стрелок">
-                            <img src="{{ m.get('Стрелок', {}).get('image_url', '') }}"><div><div class="n">Стрелок</div><div class="l">Ур.2</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Имперский ассасин">
-                            <img src="{{ m.get('Имперский ассасин', {}).get('image_url', '') }}"><div><div class="n">Имп. ассасин</div><div class="l">Ур.3</div></div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- МАГИ -->
-                <div class="branch">
-                    <div class="branch-title mage">Маги</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Ученик">
-                            <img src="{{ m.get('Ученик', {}).get('image_url', '') }}"><div><div class="n">Ученик</div><div class="l">Ур.1</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="unit-card" data-u="Маг">
-                            <img src="{{ m.get('Маг', {}).get('image_url', '') }}"><div><div class="n">Маг</div><div class="l">Ур.2</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="fork">
-                            <div class="evo-line">
-                                <div class="unit-card" data-u="Волшебник">
-                                    <img src="{{ m.get('Волшебник', {}).get('image_url', '') }}"><div><div class="n">Волшебник</div><div class="l">Ур.3</div></div>
-                                </div>
-                                <span class="arrow">→</span>
-                                <div class="unit-card" data-u="Белый волшебник">
-                                    <img src="{{ m.get('Белый волшебник', {}).get('image_url', '') }}"><div><div class="n">Белый волшебник</div><div class="l">Ур.4</div></div>
-                                </div>
-                            </div>
-                            <div class="unit-card" data-u="Элементалист">
-                                <img src="{{ m.get('Элементалист', {}).get('image_url', '') }}"><div><div class="n">Элементалист</div><div class="l">Ур.3</div></div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- ЖРЕЦЫ -->
-                <div class="branch">
-                    <div class="branch-title healer">Жрецы</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Послушник">
-                            <img src="{{ m.get('Послушник', {}).get('image_url', '') }}"><div><div class="n">Послушник</div><div class="l">Ур.1</div></div>
-                        </div>
-                        <span class="arrow">→</span>
-                        <div class="fork">
-                            <div class="evo-line">
-                                <div class="unit-card" data-u="Жрец">
-                                    <img src="{{ m.get('Жрец', {}).get('image_url', '') }}"><div><div class="n">Жрец</div><div class="l">Ур.2</div></div>
-                                </div>
-                                <span class="arrow">→</span>
-                                <div class="unit-card" data-u="Имперский жрец">
-                                    <img src="{{ m.get('Имперский жрец', {}).get('image_url', '') }}"><div><div class="n">Имп. жрец</div><div class="l">Ур.3</div></div>
-                                </div>
-                                <span class="arrow">→</span>
-                                <div class="unit-card" data-u="Иерофант">
-                                    <img src="{{ m.get('Иерофант', {}).get('image_url', '') }}"><div><div class="n">Иерофант</div><div class="l">Ур.4</div></div>
-                                </div>
-                            </div>
-                            <div class="evo-line">
-                                <div class="unit-card" data-u="Клирик">
-                                    <img src="{{ m.get('Клирик', {}).get('image_url', '') }}"><div><div class="n">Клирик</div><div class="l">Ур.2</div></div>
-                                </div>
-                                <span class="arrow">→</span>
-                                <div class="unit-card" data-u="Матриарх">
-                                    <img src="{{ m.get('Матриарх', {}).get('image_url', '') }}"><div><div class="n">Матриарх</div><div class="l">Ур.3</div></div>
-                                </div>
-                                <span class="arrow">→</span>
-                                <div class="unit-card" data-u="Прорицательница">
-                                    <img src="{{ m.get('Прорицательница', {}).get('image_url', '') }}"><div><div class="n">Прорицательница</div><div class="l">Ур.4</div></div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- ОСОБЫЕ -->
-                <div class="branch">
-                    <div class="branch-title special">Особые</div>
-                    <div class="evo-line">
-                        <div class="unit-card" data-u="Титан">
-                            <img src="{{ m.get('Титан', {}).get('image_url', '') }}"><div><div class="n">Титан</div><div class="l">Большой</div></div>
-                        </div>
-                        <div class="unit-card" data-u="Оживший доспех">
-                            <img src="{{ m.get('Оживший доспех', {}).get('image_url', '') }}"><div><div class="n">Оживший доспех</div><div class="l">Большой</div></div>
-                        </div>
-                        <div class="unit-card" data-u="Голем">
-                            <img src="{{ m.get('Голем', {}).get('image_url', '') }}"><div><div class="n">Голем</div><div class="l">Большой</div></div>
-                        </div>
-                        <div class="unit-card" data-u="Мизраэль">
-                            <img src="{{ m.get('Мизраэль', {}).get('image_url', '') }}"><div><div class="n">Мизраэль</div><div class="l">Босс</div></div>
-                        </div>
-                    </div>
-                </div>
-                
+                {% endfor %}
+                {% endfor %}
             </div>
             
             <!-- IMAGE CENTER -->
@@ -800,81 +1029,507 @@ TREE_HTML = """
     
     <footer>Данные: <a href="https://disciples.fandom.com" target="_blank">Disciples Wiki</a></footer>
     
-    <script>
-    const D = {{ data | safe }};
-    
-    document.querySelectorAll('.unit-card').forEach(c => {
-        c.addEventListener('click', () => {
-            document.querySelectorAll('.unit-card').forEach(x => x.classList.remove('sel'));
-            c.classList.add('sel');
-            
-            const n = c.dataset.u;
-            const u = D[n];
-            if (!u) return;
-            
-            // Центральное изображение
-            const imgBox = document.getElementById('img-box');
-            const img = document.getElementById('i-img');
-            const placeholder = imgBox.querySelector('.placeholder');
-            
-            if (u.image_url) {
-                img.src = u.image_url;
-                img.style.display = 'block';
-                if (placeholder) placeholder.style.display = 'none';
-            }
-            
-            // Панель данных
-            document.getElementById('empty').style.display = 'none';
-            document.getElementById('info').classList.add('show');
-            
-            document.getElementById('i-name').textContent = n;
-            document.getElementById('i-sub').textContent = u.name_en || '';
-            
-            document.getElementById('i-hp').textContent = u['Здоровье'] || '—';
-            document.getElementById('i-armor').textContent = u['Броня'] || '—';
-            document.getElementById('i-dmg').textContent = u['Урон'] || '—';
-            document.getElementById('i-cost').textContent = u['Цена'] || '—';
-            
-            document.getElementById('i-lvl').textContent = u['Уровень'] || '—';
-            document.getElementById('i-atk').textContent = u['Атака'] || '—';
-            document.getElementById('i-init').textContent = u['Инициатива'] || '—';
-            document.getElementById('i-src').textContent = u['Источник'] || '—';
-            document.getElementById('i-hit').textContent = u['Шанс попадания'] || '—';
-            document.getElementById('i-reach').textContent = u['Дальность'] || '—';
-            document.getElementById('i-tgt').textContent = u['Кол-во целей'] || '—';
-            document.getElementById('i-ward').textContent = u['Защита'] || '—';
-            document.getElementById('i-imm').textContent = u['Иммунитет'] || '—';
-            document.getElementById('i-xpk').textContent = u['Опыт за убийство'] || '—';
-            document.getElementById('i-xpn').textContent = u['Опыт до апгрейда'] || '—';
-            
-            document.getElementById('i-link').href = u.url || '#';
-        });
-    });
-    </script>
+    <script>const D = {{ data | safe }};</script>
+    <script src="{{ asset_url('tree.js') }}"></script>
 </body>
 </html>
 """
 
 
+# Шаблоны компилируются один раз при старте
+table_template = app.jinja_env.from_string(TABLE_HTML)
+tree_template = app.jinja_env.from_string(TREE_HTML)
+
+# Отрендеренные страницы живут, пока не сменится версия данных
+pages = PageCache()
+
+
+# Мониторинг: задержки и размеры ответов по маршрутам, счётчики кэшей и данных (/metrics)
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+def count_bytes(chunks, labels):
+    """Считаем байты потокового ответа по мере отправки"""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        monitor.inc('http_response_bytes_total', labels, size)
+
+
+@app.after_request
+def record_request(response):
+    """Задержка, статус и размер ответа по шаблону маршрута (/images/<path:filename>)"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = {'route': route}
+    monitor.observe('http_request_duration_seconds', time.perf_counter() - g.started, labels)
+    monitor.inc('http_requests_total', dict(labels, method=request.method, status=response.status_code))
+    if response.is_streamed:
+        if not response.direct_passthrough:
+            response.response = count_bytes(response.response, labels)
+        elif response.content_length is not None:
+            monitor.inc('http_response_bytes_total', labels, response.content_length)
+    else:
+        monitor.inc('http_response_bytes_total', labels, response.content_length or 0)
+    monitor.maybe_flush()
+    return response
+
+
+@monitor.collector
+def cache_stats():
+    return [
+        ('cache_hits_total', {'cache': 'pages'}, pages.hits),
+        ('cache_misses_total', {'cache': 'pages'}, pages.misses),
+        ('cache_hits_total', {'cache': 'images'}, hot_images.hits),
+        ('cache_misses_total', {'cache': 'images'}, hot_images.misses),
+    ]
+
+
+@monitor.collector
+def data_stats():
+    # Без проверки файлов: сбор метрик не должен запускать перезагрузку
+    snap = store.current()
+    return [
+        ('data_reloads_total', {}, store.reloads),
+        ('data_reload_duration_seconds_total', {}, store.reload_seconds),
+        ('data_version', {}, snap.version),
+        ('data_units', {}, len(snap.units)),
+    ]
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    return Response(monitor.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+# Таблицу от этого числа строк отдаём потоком (?stream=1 — всегда, ?stream=0 — никогда)
+STREAM_THRESHOLD = 1000
+STREAM_FIRST_CHUNK = 2 * 1024
+STREAM_CHUNK = 32 * 1024
+
+
+def table_context(snap, virtual=False):
+    return dict(units=snap.units, num=snap.dataset.sort_values(), metrics=snap.metrics.visible(),
+                virtual=virtual)
+
+
+def render_table(snap, virtual=False):
+    return table_template.render(**table_context(snap, virtual))
+
+
+def stream_table(snap):
+    """
+    Потоковый рендеринг таблицы: шапка страницы уходит клиенту сразу,
+    строки — пачками по мере рендеринга. Готовая страница сжимается
+    и попадает в кэш уже в фоне, после ответа; следующие запросы
+    получают её целиком с ETag.
+    """
+    def generate():
+        parts, buf, size = [], [], 0
+        limit = STREAM_FIRST_CHUNK
+        for piece in table_template.generate(**table_context(snap)):
+            buf.append(piece)
+            size += len(piece)
+            if size >= limit:
+                chunk = ''.join(buf)
+                parts.append(chunk)
+                buf, size, limit = [], 0, STREAM_CHUNK
+                yield chunk
+        chunk = ''.join(buf)
+        parts.append(chunk)
+        yield chunk
+        pages.fill_later('table', snap.version, lambda: ''.join(parts))
+
+    return Response(generate(), content_type='text/html; charset=utf-8')
+
+
+def unit_json(unit):
+    """JSON одного юнита — одинаковый для /api/units/<имя> и статического экспорта"""
+    return json.dumps(unit, ensure_ascii=False)
+
+
+def tree_index(snap):
+    """Короткий индекс для древа: только то, что нужно до запроса деталей"""
+    return {
+        name: {'image_url': u.get('image_url', ''), 'name_en': u.get('name_en', '')}
+        for name, u in snap.by_name.items()
+    }
+
+
+def render_tree(snap):
+    """Раскладка древа строится из графа апгрейдов один раз на версию данных"""
+    m = snap.by_name
+    return tree_template.render(layout=evolution.layout(m),
+                                data=json.dumps(tree_index(snap), ensure_ascii=False))
+
+
+def query_flag(name):
+    """Флаг из строки запроса: True для 1/true/yes, False для прочих значений, None — если не задан"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
 @app.route("/")
 def index():
-    cols, units = load_csv_data()
-    if not units:
+    snap = store.get()
+    if not snap:
         return "<h1>Запустите python parser.py</h1>"
-    return render_template_string(TABLE_HTML, units=units)
+    if request.args.get('view') == 'virtual':
+        # Виртуальная таблица: строки подгружаются из /api/units при прокрутке
+        return pages.get('table-virtual', snap.version,
+                         lambda: render_table(snap, virtual=True)).response()
+    cached = pages.peek('table', snap.version)
+    stream = query_flag('stream')
+    if stream is None:
+        stream = len(snap.units) >= STREAM_THRESHOLD
+    if cached is None and stream:
+        return stream_table(snap)
+    return pages.get('table', snap.version, lambda: render_table(snap)).response()
 
 
 @app.route("/tree")
 def tree():
-    cols, units = load_csv_data()
-    if not units:
+    snap = store.get()
+    if not snap:
         return "<h1>Запустите python parser.py</h1>"
-    m = {u['name']: u for u in units}
-    return render_template_string(TREE_HTML, m=m, data=json.dumps(m, ensure_ascii=False))
+    return pages.get('tree', snap.version, lambda: render_tree(snap)).response()
+
+
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 500
+
+# Поля, которых нет в данных, но которые API умеет вычислить
+COMPUTED_FIELDS = {
+    'thumb_url': lambda u: images.thumb_url(u.get('image_url', ''), 32),
+}
+
+
+def unit_fields(snap, i, fields):
+    """Выбранные поля юнита i: колонки, вычисляемые поля и производные показатели"""
+    unit = snap.units[i]
+    row = {}
+    for f in fields:
+        if f in COMPUTED_FIELDS:
+            row[f] = COMPUTED_FIELDS[f](unit)
+        elif f in snap.metrics:
+            row[f] = snap.metrics.value(f, i)
+        else:
+            row[f] = unit.get(f, '')
+    return row
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded.encode()).decode())
+
+
+def api_error(message, status=400):
+    return jsonify({'error': message}), status
+
+
+@app.route("/api/units")
+def api_units():
+    """
+    Список юнитов в JSON.
+    ?sort=<колонка>&order=asc|desc — сортировка по готовому порядку колонки
+    ?limit=&offset= или ?cursor= — постраничный вывод
+    ?fields=name,Уровень,... — только нужные колонки
+    (плюс вычисляемое поле thumb_url — адрес превью 32 px
+    и производные показатели из /api/metrics, числами)
+    ?q=... — только юниты, найденные поиском
+    ?filter=<колонка>:<значение> — только юниты с этим значением
+    (типизированные колонки и производные показатели; можно несколько)
+    """
+    snap = store.get()
+    args = request.args
+
+    sort = args.get('sort')
+    if sort and sort not in snap.columns and sort not in snap.metrics:
+        return api_error(f"Неизвестная колонка для сортировки: {sort}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return api_error("order должен быть asc или desc")
+
+    fields = None
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields
+                   if f not in snap.columns and f not in COMPUTED_FIELDS and f not in snap.metrics]
+        if unknown:
+            return api_error(f"Неизвестные поля: {', '.join(unknown)}")
+
+    conditions = []
+    for item in args.getlist('filter'):
+        column, sep, value = item.partition(':')
+        if not sep or column not in snap.dataset:
+            return api_error(f"Фильтр должен быть вида колонка:значение по типизированной колонке: {item}")
+        conditions.append((column, value))
+
+    try:
+        limit = min(int(args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT)
+        if 'cursor' in args:
+            offset = decode_cursor(args['cursor'])
+        else:
+            offset = int(args.get('offset', 0))
+    except ValueError:
+        return api_error("limit, offset и cursor должны быть целыми числами")
+    if limit < 1 or offset < 0:
+        # limit=0 дал бы курсор на ту же страницу — клиент ходил бы по кругу
+        return api_error("limit должен быть не меньше 1, offset — не отрицательным")
+
+    q = args.get('q', '').strip()
+    if q:
+        # Найденные поиском: по релевантности или в порядке сортировки
+        hits = snap.search_index.search(q)
+        if sort:
+            found = {doc for doc, _ in hits}
+            indexes = [i for i in snap.order(sort, descending=(order == 'desc')) if i in found]
+        else:
+            indexes = [doc for doc, _ in hits]
+    elif sort:
+        indexes = snap.order(sort, descending=(order == 'desc'))
+    else:
+        indexes = range(len(snap.units))
+    if conditions:
+        # Фильтр считается по векторам колонок, без разбора строк
+        keep = snap.dataset.where(conditions)
+        indexes = np.asarray(indexes, dtype=np.intp)
+        indexes = indexes[keep[indexes]].tolist()
+
+    total = len(indexes)
+    window = indexes[offset:offset + limit]
+    if fields:
+        page = [unit_fields(snap, i, fields) for i in window]
+    else:
+        page = [snap.units[i] for i in window]
+
+    next_offset = offset + limit
+    return jsonify({
+        'version': snap.version,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': encode_cursor(next_offset) if next_offset < total else None,
+        'units': list(page),
+    })
+
+
+@app.route("/api/units/<path:name>")
+def api_unit(name):
+    """
+    Все характеристики одного юнита.
+    JSON сериализуется один раз на версию данных и отдаётся с ETag;
+    суффикс .json допустим, чтобы адреса совпадали со статическим экспортом.
+    """
+    if name.endswith('.json'):
+        name = name[:-len('.json')]
+    snap = store.get()
+    unit = snap.by_name.get(name)
+    if unit is None:
+        return api_error(f"Юнит не найден: {name}", 404)
+    page = pages.get(f"unit:{name}", snap.version, lambda: unit_json(unit), JSON)
+    return page.response()
+
+
+def metrics_json(snap):
+    return json.dumps({
+        'version': snap.version,
+        'metrics': snap.metrics.describe(),
+        'units': [dict(name=u.get('name', ''), **snap.metrics.row(i))
+                  for i, u in enumerate(snap.units)],
+    }, ensure_ascii=False)
+
+
+@app.route("/api/metrics")
+def api_metrics():
+    """
+    Производные показатели всех юнитов (null — не хватает исходных данных).
+    Считаются вместе со снимком, JSON — один раз на версию данных.
+    Сортировать по ним можно через /api/units?sort=<показатель>.
+    """
+    snap = store.get()
+    return pages.get('metrics', snap.version, lambda: metrics_json(snap), JSON).response()
+
+
+BATTLE_DEFAULT = 10000
+BATTLE_MAX = 200000
+# Процессов для симуляции боёв (по умолчанию — все ядра)
+BATTLE_WORKERS = int(os.environ.get('BATTLE_WORKERS', 0)) or None
+
+
+@app.route("/api/battle")
+def api_battle():
+    """
+    Монте-Карло симуляция боя двух отрядов.
+    ?a=Рыцарь,Лучник*2,Клирик&b=Ангел — отряды (имя*N — N одинаковых юнитов),
+    в каждом не больше 6 клеток; большой юнит занимает две
+    ?battles=10000&seed=0 — число боёв и зерно; при одном seed ответ один и тот же
+    """
+    snap = store.get()
+    args = request.args
+    squads = []
+    for key in ('a', 'b'):
+        try:
+            names = battle.parse_squad(args.get(key, ''))
+        except ValueError as e:
+            return api_error(f"Отряд {key}: {e}")
+        if not names:
+            return api_error(f"Укажите отряд {key}: ?{key}=Имя,Имя*2")
+        missing = [n for n in names if n not in snap.by_name]
+        if missing:
+            return api_error(f"Неизвестные юниты: {', '.join(missing)}")
+        if battle.squad_slots(names, evolution.is_large) > battle.SQUAD_SLOTS:
+            return api_error(f"Отряд {key} не помещается в {battle.SQUAD_SLOTS} клеток "
+                             f"(большой юнит занимает две)")
+        squads.append([snap.by_name[n] for n in names])
+
+    try:
+        battles = int(args.get('battles', BATTLE_DEFAULT))
+        seed = int(args.get('seed', 0))
+    except ValueError:
+        return api_error("battles и seed должны быть целыми числами")
+    if not 0 < battles <= BATTLE_MAX:
+        return api_error(f"battles должно быть от 1 до {BATTLE_MAX}")
+    if seed < 0:
+        return api_error("seed не может быть отрицательным")
+
+    large = {n for n in snap.by_name if evolution.is_large(n)}
+    try:
+        result = battle.simulate(squads[0], squads[1], battles, seed, BATTLE_WORKERS, large)
+    except ValueError as e:
+        return api_error(str(e))
+    return jsonify(result)
+
+
+SQUAD_MAX_SLOTS = 12
+SQUAD_MAX_BUDGET = 1000000
+
+# Оптимизаторы отряда по целям; подзадачи общие для всех запросов одной версии данных
+optimizers = {}
+
+
+def get_optimizer(snap, objective):
+    key = (snap.version, objective)
+    optimizer = optimizers.get(key)
+    if optimizer is None:
+        optimizer = SquadOptimizer.for_snapshot(snap, objective, evolution.is_large)
+        # Старые версии данных больше не понадобятся
+        for old in [k for k in optimizers if k[0] != snap.version]:
+            optimizers.pop(old, None)
+        optimizers[key] = optimizer
+    return optimizer
+
+
+@app.route("/api/squad")
+def api_squad():
+    """
+    Лучший отряд под бюджет.
+    ?budget=1500 — золото (по колонке Цена)
+    ?objective=damage|ehp|healing — что максимизируем (по умолчанию damage)
+    ?slots=6 — клеток в отряде; большие юниты занимают две
+    """
+    snap = store.get()
+    args = request.args
+    objective = args.get('objective', 'damage')
+    if objective not in OBJECTIVES:
+        return api_error(f"objective должен быть одним из: {', '.join(OBJECTIVES)}")
+    try:
+        budget = int(args['budget'])
+        slots = int(args.get('slots', DEFAULT_SLOTS))
+    except KeyError:
+        return api_error("Укажите бюджет: ?budget=<золото>")
+    except ValueError:
+        return api_error("budget и slots должны быть целыми числами")
+    if not 0 <= budget <= SQUAD_MAX_BUDGET:
+        return api_error(f"budget должен быть от 0 до {SQUAD_MAX_BUDGET}")
+    if not 1 <= slots <= SQUAD_MAX_SLOTS:
+        return api_error(f"slots должно быть от 1 до {SQUAD_MAX_SLOTS}")
+
+    value, picked = get_optimizer(snap, objective).solve(budget, slots)
+    squad = [snap.units[i] for i in picked]
+    return jsonify({
+        'version': snap.version,
+        'objective': objective,
+        'description': OBJECTIVES[objective],
+        'budget': budget,
+        'slots': slots,
+        'value': round(value, 2),
+        'cost': int(sum(snap.dataset['Цена'].values[i] for i in picked)),
+        'slots_used': sum(2 if evolution.is_large(u['name']) else 1 for u in squad),
+        'squad': [u['name'] for u in squad],
+    })
+
+
+SEARCH_DEFAULT_LIMIT = 20
+
+
+@app.route("/api/search")
+def api_search():
+    """
+    Поиск по имени (рус/англ), атаке, источнику, защите и иммунитету.
+    ?q=ангел, ?q=angel, ?q=инквиз (префикс), ?q=паладн (опечатка)
+    """
+    snap = store.get()
+    q = request.args.get('q', '').strip()
+    if not q:
+        return api_error("Пустой запрос: укажите ?q=")
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    except ValueError:
+        return api_error("limit должен быть целым числом")
+    if limit < 1:
+        return api_error("limit должен быть не меньше 1")
+
+    hits = snap.search_index.search(q)
+    return jsonify({
+        'version': snap.version,
+        'query': q,
+        'total': len(hits),
+        'units': [
+            {
+                'name': snap.units[doc].get('name', ''),
+                'name_en': snap.units[doc].get('name_en', ''),
+                'image_url': snap.units[doc].get('image_url', ''),
+                'score': round(score, 3),
+            }
+            for doc, score in hits[:limit]
+        ],
+    })
+
+
+def warm_cache(snap=None):
+    """
+    Отрендерить страницы и JSON текущей версии заранее.
+    В режиме preload gunicorn это делает мастер до fork, и воркеры
+    получают готовые ответы в общих (copy-on-write) страницах памяти.
+    """
+    snap = snap or store.get()
+    if not snap:
+        return 0
+    pages.get('table', snap.version, lambda: render_table(snap))
+    pages.get('table-virtual', snap.version, lambda: render_table(snap, virtual=True))
+    pages.get('tree', snap.version, lambda: render_tree(snap))
+    pages.get('metrics', snap.version, lambda: metrics_json(snap), JSON)
+    for name, unit in snap.by_name.items():
+        pages.get(f"unit:{name}", snap.version, lambda: unit_json(unit), JSON)
+    return len(snap.by_name) + 4
 
 
 if __name__ == "__main__":
     import os
     port = int(os.environ.get("PORT", 5000))
     print(f"\nDisciples II — http://127.0.0.1:{port}\n")
+    # kill -HUP <pid> — перечитать данные без перезапуска
+    store.install_signal_handler()
     app.run(debug=False, host="0.0.0.0", port=port)
@@ -0,0 +1,62 @@
+"""
+Статические ресурсы (CSS и JS) с хэшем содержимого в имени файла.
+Сжатые gzip/brotli варианты считаются один раз при регистрации,
+браузер кэширует файлы навсегда: новая версия — новый адрес.
+"""
+
+import os
+import threading
+
+from pages import Page
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+
+class AssetRegistry:
+    """Ресурсы по логическому имени ('app.css') и по имени с хэшем ('app.1a2b3c4d.css')"""
+
+    def __init__(self, prefix='/assets/'):
+        self.prefix = prefix
+        self._by_name = {}
+        self._by_file = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprinted(name, page):
+        base, ext = os.path.splitext(name)
+        return f"{base}.{page.etag[:12]}{ext}"
+
+    def add(self, name, content):
+        """Зарегистрировать (или заменить) ресурс, вернуть его адрес"""
+        ext = os.path.splitext(name)[1]
+        page = Page(content, CONTENT_TYPES.get(ext, 'application/octet-stream'))
+        filename = self.fingerprinted(name, page)
+        with self._lock:
+            old = self._by_name.get(name)
+            if old is not None:
+                self._by_file.pop(old[0], None)
+            self._by_name[name] = (filename, page)
+            self._by_file[filename] = page
+        return self.prefix + filename
+
+    def remove(self, name):
+        with self._lock:
+            old = self._by_name.pop(name, None)
+            if old is not None:
+                self._by_file.pop(old[0], None)
+
+    def url(self, name):
+        """Адрес ресурса с хэшем или '' если такого ресурса нет"""
+        entry = self._by_name.get(name)
+        return self.prefix + entry[0] if entry else ''
+
+    def get(self, filename):
+        """Готовый ответ по имени файла с хэшем"""
+        return self._by_file.get(filename)
+
+    def files(self):
+        """Все ресурсы: {имя файла с хэшем: Page}"""
+        return dict(self._by_file)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Собирает спрайт-атлас иконок юнитов: все картинки из images/ в одном файле
+images/atlas/atlas-32.png (и atlas-64.png для retina) плюс карта atlas.json.
+Таблица и древо тогда грузят одну картинку вместо десятков.
+"""
+
+import json
+import math
+import os
+
+from PIL import Image
+
+from images import ATLAS_DIR, ATLAS_MAP, ATLAS_SIZES, ImageCatalog, atlas_file
+from thumbnails import IMAGES_DIR, fit_image, source_images
+
+
+def build_sheet(images_dir, files, cols, size):
+    """Склеить иконки в сетку cols×rows с ячейкой size×size"""
+    rows = max(1, math.ceil(len(files) / cols))
+    sheet = Image.new('RGBA', (cols * size, rows * size), (0, 0, 0, 0))
+    for i, filename in enumerate(files):
+        icon = fit_image(os.path.join(images_dir, filename), size)
+        # Центрируем иконку в ячейке, как object-fit: contain
+        x = (i % cols) * size + (size - icon.width) // 2
+        y = (i // cols) * size + (size - icon.height) // 2
+        sheet.paste(icon, (x, y))
+    return sheet
+
+
+def build(images_dir=IMAGES_DIR, force=False):
+    """Собрать атлас, если набор картинок изменился; True, если пересобран"""
+    catalog = ImageCatalog(images_dir)
+    source = catalog.source_digest()
+    map_path = os.path.join(images_dir, ATLAS_DIR, ATLAS_MAP)
+
+    if not force:
+        try:
+            with open(map_path, encoding='utf-8') as f:
+                if json.load(f).get('source') == source:
+                    return False
+        except (OSError, ValueError):
+            pass
+
+    files = source_images(images_dir)
+    cols = max(1, math.ceil(math.sqrt(len(files))))
+    rows = max(1, math.ceil(len(files) / cols))
+    os.makedirs(os.path.join(images_dir, ATLAS_DIR), exist_ok=True)
+    for size in ATLAS_SIZES:
+        sheet = build_sheet(images_dir, files, cols, size)
+        sheet.save(os.path.join(images_dir, atlas_file(size)), 'PNG', optimize=True)
+
+    atlas = {
+        'source': source,
+        'cols': cols,
+        'rows': rows,
+        'sizes': list(ATLAS_SIZES),
+        'files': files,
+    }
+    with open(map_path, 'w', encoding='utf-8') as f:
+        json.dump(atlas, f, ensure_ascii=False, indent=2)
+    return True
+
+
+def main():
+    build(force=True)
+    print(f"✓ Атлас собран: {os.path.join(IMAGES_DIR, ATLAS_DIR)}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Симулятор боя двух отрядов методом Монте-Карло.
+Тысячи боёв идут одновременно: состояние всех боёв пачки — массивы NumPy
+[бой, юнит], ход каждого юнита обрабатывается сразу во всех боях пачки.
+Пачки раздаются пулу процессов; у каждой своё зерно из SeedSequence,
+поэтому результат зависит только от seed, а не от числа процессов.
+
+    python battle.py Рыцарь "Лучник*2" Клирик --vs Ангел --battles 100000
+
+Модель упрощена по правилам Disciples II:
+- раунд за раундом все живые юниты ходят по Инициативе (±10% случайно);
+- юниты ближнего боя стоят в первой линии и бьют только первую линию
+  противника, пока в ней кто-то жив; остальные — во второй линии;
+- Кол-во целей 6 — удар по всем живым врагам (или лечение всех союзников);
+- каждый удар попадает с Шансом попадания, урон снижается Бронёй;
+- Иммунитет к Источнику атаки отменяет урон, Защита — только первый удар;
+- пропущенные в данных значения считаются нулём (у лекарей без силы
+  лечения лечение ничего не даёт).
+"""
+
+import argparse
+import atexit
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset import NULL_VALUES, parse_number
+
+BATCH_SIZE = 2048
+MAX_ROUNDS = 50
+INITIATIVE_SPREAD = 0.1
+ALL_TARGETS = 6
+# Клеток в отряде; большой юнит занимает две
+SQUAD_SLOTS = 6
+MAX_ARMOR = 90.0
+DEFAULT_HIT = 0.8
+
+SPLIT_RE = re.compile(r'\s*[,/]\s*')
+COUNT_RE = re.compile(r'^(.*?)\s*\*\s*(\d+)$')
+
+
+def parse_squad(spec, max_units=SQUAD_SLOTS):
+    """
+    'Рыцарь, Лучник*2, Клирик' → ['Рыцарь', 'Лучник', 'Лучник', 'Клирик'].
+    Больше max_units юнитов в отряде не бывает: такой отряд — ValueError,
+    и до разворачивания 'имя*N' дело не доходит.
+    """
+    names = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        m = COUNT_RE.match(part)
+        name, count = (m.group(1), int(m.group(2))) if m else (part, 1)
+        if count < 1:
+            raise ValueError(f"Число юнитов должно быть не меньше 1: {part}")
+        if len(names) + count > max_units:
+            raise ValueError(f"В отряде не больше {max_units} юнитов")
+        names.extend([name] * count)
+    return names
+
+
+def squad_slots(names, is_large=lambda name: False):
+    """Сколько клеток занимает отряд: большой юнит — две"""
+    return sum(2 if is_large(name) else 1 for name in names)
+
+
+def sources(value):
+    """Множество источников/стихий: 'Земля, Яд' → {'земля', 'яд'}"""
+    return {s.lower() for s in SPLIT_RE.split((value or '').strip())
+            if s and s not in NULL_VALUES and s != 'Нет'}
+
+
+def number(unit, column, default=0.0):
+    value = parse_number(unit.get(column))
+    return default if value is None else value
+
+
+class Battle:
+    """
+    Подготовленный бой: характеристики юнитов обеих сторон в массивах
+    длины U (сначала отряд A, потом B) и матрицы «атакующий × цель».
+    """
+
+    def __init__(self, squad_a, squad_b, large=()):
+        if not squad_a or not squad_b:
+            raise ValueError("В каждом отряде должен быть хотя бы один юнит")
+        units = list(squad_a) + list(squad_b)
+        for unit in units:
+            if number(unit, 'Здоровье') <= 0:
+                raise ValueError(f"Нет данных о здоровье: {unit.get('name')}")
+
+        self.names = [u.get('name', '') for u in units]
+        self.side = np.array([0] * len(squad_a) + [1] * len(squad_b), dtype=np.int8)
+        self.hp = np.array([number(u, 'Здоровье') for u in units])
+        self.armor = np.array([min(number(u, 'Броня'), MAX_ARMOR) for u in units])
+        self.damage = np.array([number(u, 'Урон') for u in units])
+        self.hit = np.array([number(u, 'Шанс попадания', DEFAULT_HIT * 100) for u in units]) / 100.0
+        self.initiative = np.array([number(u, 'Инициатива') for u in units])
+        self.all_targets = np.array([number(u, 'Кол-во целей', 1) >= ALL_TARGETS for u in units])
+        self.healer = np.array(['лечение' in (u.get('Класс атаки') or '').lower() for u in units])
+        self.melee = np.array([(u.get('Дальность') or '').strip() == 'Соседние' for u in units])
+        self.front = self.melee | np.array([u.get('name') in large for u in units])
+
+        # Первый источник атаки против иммунитетов и защит каждой цели
+        attack = [next(iter(SPLIT_RE.split((u.get('Источник') or '').strip().lower())), '')
+                  for u in units]
+        immune = [sources(u.get('Иммунитет')) for u in units]
+        ward = [sources(u.get('Защита')) for u in units]
+        self.immune = np.array([[src in imm for imm in immune] for src in attack])
+        self.ward = np.array([[src in w for w in ward] for src in attack])
+        self.has_ward = np.array([bool(w) for w in ward])
+
+    def __len__(self):
+        return len(self.hp)
+
+    def run(self, battles, seed):
+        """
+        Сыграть пачку боёв. seed — SeedSequence (или число).
+        Возвращает суммы: [побед A, побед B, ничьих, раундов, выживших A, выживших B]
+        """
+        rng = np.random.default_rng(seed)
+        n, size = battles, len(self)
+        rows = np.arange(n)
+        side_a = self.side == 0
+        hp = np.tile(self.hp, (n, 1))
+        ward_active = np.tile(self.has_ward, (n, 1))
+        done = np.zeros(n, dtype=bool)
+        winner = np.full(n, -1, dtype=np.int8)
+        rounds = np.zeros(n, dtype=np.int32)
+
+        for _ in range(MAX_ROUNDS):
+            if done.all():
+                break
+            rounds[~done] += 1
+            spread = 1.0 + INITIATIVE_SPREAD * (2.0 * rng.random((n, size)) - 1.0)
+            order = np.argsort(-self.initiative * spread, axis=1, kind='stable')
+            for k in range(size):
+                actor = order[:, k]
+                acting = ~done & (hp[rows, actor] > 0)
+                if not acting.any():
+                    continue
+                b, a = rows[acting], actor[acting]
+                self._act(rng, hp, ward_active, b, a)
+
+                alive = hp > 0
+                alive_a = (alive & side_a).any(axis=1)
+                alive_b = (alive & ~side_a).any(axis=1)
+                finished = ~done & ~(alive_a & alive_b)
+                winner[finished & alive_a] = 0
+                winner[finished & alive_b] = 1
+                done |= finished
+
+        alive = hp > 0
+        return np.array([
+            np.count_nonzero(winner == 0),
+            np.count_nonzero(winner == 1),
+            np.count_nonzero(winner < 0),
+            rounds.sum(),
+            (alive & side_a).sum(),
+            (alive & ~side_a).sum(),
+        ], dtype=np.int64)
+
+    def _act(self, rng, hp, ward_active, b, a):
+        """Ход юнитов a в боях b (в каждом бою ходит ровно один юнит)"""
+        cur = hp[b]
+        alive = cur > 0
+        enemy = self.side[None, :] != self.side[a][:, None]
+
+        # Лекари: всем союзникам или самому раненому
+        heal = self.healer[a]
+        if heal.any():
+            hb, ha = b[heal], a[heal]
+            allies = alive[heal] & ~enemy[heal]
+            wounded = np.where(allies, self.hp[None, :] - cur[heal], -1.0)
+            target = allies & self.all_targets[ha][:, None]
+            single = ~self.all_targets[ha]
+            target[single, wounded[single].argmax(axis=1)] = True
+            target &= allies
+            healed = cur[heal] + np.where(target, self.damage[ha][:, None], 0.0)
+            hp[hb] = np.minimum(healed, self.hp[None, :])
+
+        # Остальные атакуют
+        fight = ~heal & (self.damage[a] > 0)
+        if not fight.any():
+            return
+        fb, fa = b[fight], a[fight]
+        reachable = alive[fight] & enemy[fight]
+        # Ближний бой достаёт вторую линию, только когда первая пала
+        front_alive = (reachable & self.front[None, :]).any(axis=1)
+        blocked = self.melee[fa] & front_alive
+        reachable &= ~blocked[:, None] | self.front[None, :]
+
+        target = reachable & self.all_targets[fa][:, None]
+        single = ~self.all_targets[fa]
+        if single.any():
+            pick = np.where(reachable[single], rng.random((np.count_nonzero(single), len(self))), -1.0)
+            chosen = np.zeros_like(pick, dtype=bool)
+            chosen[np.arange(len(pick)), pick.argmax(axis=1)] = True
+            target[single] = chosen & reachable[single]
+
+        target &= rng.random(target.shape) < self.hit[fa][:, None]
+        target &= ~self.immune[fa]
+        warded = target & self.ward[fa] & ward_active[fb]
+        ward_active[fb] &= ~warded
+        target &= ~warded
+
+        dealt = self.damage[fa][:, None] * (1.0 - self.armor[None, :] / 100.0)
+        hp[fb] = np.maximum(hp[fb] - np.where(target, dealt, 0.0), 0.0)
+
+
+def _run_batch(battle, battles, seed):
+    return battle.run(battles, seed)
+
+
+_pool = None
+_pool_workers = 0
+
+
+def get_pool(workers):
+    """
+    Общий пул процессов (создаётся при первом использовании).
+    spawn, а не fork: воркеры веб-сервера многопоточные.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown()
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def simulate(squad_a, squad_b, battles=10000, seed=0, workers=None, large=()):
+    """
+    Сыграть battles боёв отряда A против отряда B.
+    Бои делятся на пачки по BATCH_SIZE; при workers > 1 пачки считаются
+    в пуле процессов. Результат одинаков при любом workers.
+    """
+    battle = Battle(squad_a, squad_b, large)
+    sizes = [min(BATCH_SIZE, battles - start) for start in range(0, battles, BATCH_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+
+    started = time.perf_counter()
+    if workers > 1:
+        pool = get_pool(workers)
+        parts = list(pool.map(_run_batch, [battle] * len(sizes), sizes, seeds))
+    else:
+        parts = [battle.run(size, s) for size, s in zip(sizes, seeds)]
+    elapsed = time.perf_counter() - started
+
+    wins_a, wins_b, draws, rounds, alive_a, alive_b = (int(v) for v in np.sum(parts, axis=0))
+    return {
+        'a': battle.names[:len(squad_a)],
+        'b': battle.names[len(squad_a):],
+        'battles': battles,
+        'seed': seed,
+        'win_a': wins_a / battles,
+        'win_b': wins_b / battles,
+        'draw': draws / battles,
+        'avg_rounds': rounds / battles,
+        'avg_survivors_a': alive_a / battles,
+        'avg_survivors_b': alive_b / battles,
+        'seconds': elapsed,
+        'battles_per_sec': battles / elapsed if elapsed else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Симуляция боя двух отрядов (Монте-Карло)")
+    ap.add_argument('a', nargs='+', help="отряд A: имена юнитов, 'Лучник*2' — два лучника")
+    ap.add_argument('--vs', nargs='+', required=True, help="отряд B")
+    ap.add_argument('--battles', type=int, default=100000)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--workers', type=int, default=None, help="процессов (по умолчанию — все ядра)")
+    args = ap.parse_args()
+
+    from app import evolution, store
+    snap = store.get()
+
+    def squad(parts):
+        try:
+            names = parse_squad(','.join(parts))
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if squad_slots(names, evolution.is_large) > SQUAD_SLOTS:
+            raise SystemExit(f"Отряд {' + '.join(names)} не помещается в {SQUAD_SLOTS} клеток")
+        missing = [n for n in names if n not in snap.by_name]
+        if missing:
+            raise SystemExit(f"Нет таких юнитов: {', '.join(missing)}")
+        return [snap.by_name[n] for n in names]
+
+    a, b = squad(args.a), squad(args.vs)
+    large = {n for n in snap.by_name if evolution.is_large(n)}
+    result = simulate(a, b, args.battles, args.seed, args.workers, large)
+    print(f"{' + '.join(result['a'])}  vs  {' + '.join(result['b'])}")
+    print(f"  победы A: {result['win_a']:.1%}   победы B: {result['win_b']:.1%}   "
+          f"ничьи: {result['draw']:.1%}   раундов в среднем: {result['avg_rounds']:.1f}")
+    print(f"  {result['battles']} боёв за {result['seconds']:.2f} с — "
+          f"{result['battles_per_sec']:,.0f} боёв/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки приложения: путь данных (загрузка CSV, рендер таблицы и древа,
+JSON для древа, отдача картинки) и нагрузка по HTTP на gunicorn.
+Данные можно размножить — синтетические наборы в 10×, 100×, 1000× больше
+текущих юнитов показывают, как пути масштабируются до добавления рас.
+
+    python bench.py                          # микробенчмарки на текущих данных
+    python bench.py --scale 1 10 100 1000    # то же на синтетических наборах
+    python bench.py --http --workers 4 --duration 10 --concurrency 16
+    python bench.py --scale 1 100 --http --json bench.json
+    python bench.py --parse                  # разбор страниц вики: lxml против BeautifulSoup
+    python bench.py --parse .http_cache      # то же на страницах из кэша парсера
+
+Синтетика детерминирована (--seed), поэтому прогоны можно сравнивать.
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+import parser
+from app import CSV_FILE, app, images, load_csv_data, render_table, render_tree, tree_index
+from fetcher import HttpCache
+from store import Snapshot
+
+# Числовые колонки, которые слегка меняем в синтетических копиях
+JITTER_COLUMNS = ('Здоровье', 'Урон', 'Инициатива', 'Цена', 'Опыт за убийство', 'Опыт до апгрейда')
+
+HTTP_PATHS = ('/', '/tree', '/api/units?limit=50')
+
+# Сохранённые страницы юнитов для --parse (по одной на юнита Империи)
+PARSE_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pages')
+# Как у gunicorn по умолчанию: первый рендер даже большого набора укладывается
+HTTP_TIMEOUT = 30
+
+
+def synthetic_csv(scale, path, seed=0):
+    """CSV в scale раз больше исходного: копии юнитов с номером в имени и разбросом чисел"""
+    columns, units = load_csv_data(CSV_FILE)
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for copy in range(scale):
+            for unit in units:
+                row = dict(unit)
+                if copy:
+                    row['name'] = f"{unit['name']} #{copy}"
+                    row['name_en'] = f"{unit.get('name_en', '')} #{copy}"
+                    row['url'] = f"{unit.get('url', '')}#{copy}"
+                    for col in JITTER_COLUMNS:
+                        value = (row.get(col) or '').strip()
+                        if value.isdigit():
+                            row[col] = str(max(1, round(int(value) * rng.uniform(0.8, 1.2))))
+                writer.writerow(row)
+    return len(units) * scale
+
+
+def measure(func, min_time=0.5, min_runs=3):
+    """Медиана времени одного вызова (секунды) и число запусков"""
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - started < min_time:
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times), len(times)
+
+
+def snapshot_from(path):
+    columns, units = load_csv_data(path)
+    for unit in units:
+        unit['image_url'] = images.rewrite(unit.get('image_url'))
+    return Snapshot(1, columns, units)
+
+
+def bench_data(path, min_time):
+    """Микробенчмарки пути данных: [(название, секунд на вызов, запусков)]"""
+    results = []
+    results.append(('load_csv_data', *measure(lambda: load_csv_data(path), min_time)))
+    results.append(('Snapshot (индексы, метрики)', *measure(lambda: snapshot_from(path), min_time)))
+    snap = snapshot_from(path)
+    results.append(('render_table', *measure(lambda: render_table(snap), min_time)))
+    results.append(('render_tree', *measure(lambda: render_tree(snap), min_time)))
+    results.append(('json.dumps индекса древа',
+                    *measure(lambda: json.dumps(tree_index(snap), ensure_ascii=False), min_time)))
+    results.append(('json.dumps всех юнитов',
+                    *measure(lambda: json.dumps(snap.by_name, ensure_ascii=False), min_time)))
+
+    client = app.test_client()
+    url = next(u['image_url'] for u in snap.units if u.get('image_url'))
+    client.get(url)  # прогрев LRU картинок
+    results.append(('serve_image (test client)', *measure(lambda: client.get(url).data, min_time)))
+    return results
+
+
+def load_pages(path):
+    """
+    Сохранённые страницы: папка кэша парсера (*.body рядом с *.json)
+    или любая папка с HTML-файлами. [(адрес или путь, html)]
+    """
+    pages = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            if name.endswith('.json') or name.endswith('.tmp'):
+                continue
+            meta_path = full[:-len('.body')] + '.json'
+            if name.endswith('.body') and os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(full, 'rb') as f:
+                    pages.append((meta.get('url', full), HttpCache.decode(meta, f.read())))
+                continue
+            with open(full, encoding='utf-8', errors='replace') as f:
+                pages.append((full, f.read()))
+    return pages
+
+
+# Разбор страниц одним движком в чистом процессе: только parser, без app и данных.
+# Пик RSS у процесса один на всю жизнь, поэтому всё лишнее до разбора его бы заслонило.
+# Пик берём из VmHWM: ru_maxrss после fork+exec хранит пик родителя, а tracemalloc
+# здесь не годится — он не видит памяти libxml2.
+PARSE_RSS_CODE = """
+import json, os, sys
+import parser
+folder, engine = sys.argv[1:]
+
+def peak():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+
+before = peak()
+for name in sorted(os.listdir(folder)):
+    with open(os.path.join(folder, name), encoding='utf-8') as f:
+        parser.parse_unit_html(f.read(), name, '', engine)
+print(json.dumps({'rss_kb': peak() - before, 'max_rss_kb': peak()}))
+"""
+
+
+def parse_rss(pages, engine):
+    """Прирост пикового RSS за разбор всех страниц движком: {'rss_kb', 'max_rss_kb'}"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (_, html) in enumerate(pages):
+            with open(os.path.join(tmp, f"{i:05d}.html"), 'w', encoding='utf-8') as f:
+                f.write(html)
+        out = subprocess.run([sys.executable, '-c', PARSE_RSS_CODE, tmp, engine],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def bench_parse(pages, min_time):
+    """
+    Разбор страниц юнитов каждым движком парсера: медиана времени на страницу,
+    прирост пикового RSS на разборе всех страниц (у каждого движка свой процесс)
+    и совпадают ли результаты с BeautifulSoup.
+    """
+    results = []
+    reference = [parser.parse_unit_html(html, url, '', 'soup') for url, html in pages]
+    for engine in ('soup', 'lxml'):
+        times = []
+        for url, html in pages:
+            seconds, _ = measure(lambda: parser.parse_unit_html(html, url, '', engine), min_time / len(pages), 3)
+            times.append(seconds)
+        mismatches = sum(parser.parse_unit_html(html, url, '', engine) != ref
+                         for (url, html), ref in zip(pages, reference))
+        memory = parse_rss(pages, engine)
+        results.append({
+            'engine': engine,
+            'pages': len(pages),
+            'ms_per_page': statistics.median(times) * 1000,
+            'total_ms': sum(times) * 1000,
+            'rss_growth_kb': memory['rss_kb'],
+            'max_rss_kb': memory['max_rss_kb'],
+            'mismatches': mismatches,
+        })
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn не поднялся на порту {port}")
+
+
+def load_worker(port, paths, stop, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=HTTP_TIMEOUT)
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        t = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                errors[path] = errors.get(path, 0) + 1
+        except (OSError, http.client.HTTPException):
+            errors[path] = errors.get(path, 0) + 1
+            conn.close()
+            continue
+        latencies.setdefault(path, []).append(time.perf_counter() - t)
+
+
+def bench_http(csv_path, workers, duration, concurrency):
+    """Нагрузка на gunicorn: запросов в секунду и p50/p95/p99 по каждому адресу"""
+    port = free_port()
+    env = dict(os.environ, UNITS_CSV=csv_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+         '--timeout', str(HTTP_TIMEOUT),
+         '--access-logfile', '/dev/null', '--error-logfile', '-', 'app:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=HTTP_TIMEOUT)
+        conn.request('GET', '/api/units?limit=1&fields=image_url')
+        image = json.loads(conn.getresponse().read())['units'][0]['image_url']
+        conn.close()
+        paths = list(HTTP_PATHS) + [quote(image)]
+        # Прогрев: несколько проходов по всем адресам, чтобы каждый воркер
+        # загрузил данные и положил страницы в кэш (на больших наборах это секунды)
+        for _ in range(workers * 2):
+            for path in paths:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=HTTP_TIMEOUT)
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+                conn.getresponse().read()
+                conn.close()
+
+        stop = threading.Event()
+        per_thread = [({}, {}) for _ in range(concurrency)]
+        threads = [threading.Thread(target=load_worker, args=(port, paths, stop, lat, err))
+                   for lat, err in per_thread]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    results = []
+    for path in paths:
+        samples = np.array([x for lat, _ in per_thread for x in lat.get(path, ())])
+        errors = sum(err.get(path, 0) for _, err in per_thread)
+        if not len(samples):
+            results.append({'path': path, 'requests': 0, 'errors': errors})
+            continue
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        results.append({
+            'path': path,
+            'requests': len(samples),
+            'errors': errors,
+            'rps': len(samples) / elapsed,
+            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+        })
+    return results
+
+
+def print_data(scale, units, results):
+    print(f"\n== Данные ×{scale} ({units} юнитов)")
+    for name, seconds, runs in results:
+        print(f"  {name:<30} {seconds * 1000:10.3f} мс   ({runs} запусков)")
+
+
+def print_http(scale, results, workers, concurrency):
+    print(f"\n== HTTP ×{scale}: gunicorn -w {workers}, {concurrency} клиентов")
+    print(f"  {'адрес':<40} {'запр/с':>9} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'ошибок':>7}")
+    for r in results:
+        if not r['requests']:
+            print(f"  {r['path'][:40]:<40} {'—':>9} {'':>8} {'':>8} {'':>8} {r['errors']:>7}")
+            continue
+        print(f"  {r['path'][:40]:<40} {r['rps']:9.0f} {r['p50_ms']:8.2f} "
+              f"{r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['errors']:>7}")
+
+
+def print_parse(path, results):
+    print(f"\n== Разбор страниц из {path} ({results[0]['pages']} стр.)")
+    if os.path.abspath(path) == PARSE_FIXTURES:
+        print("  fixtures/pages — синтетические страницы, а не сохранённые с вики: "
+              "цифры только для сравнения движков между собой")
+    print(f"  {'движок':<8} {'мс/стр':>8} {'всего мс':>9} {'+RSS КБ':>8} {'RSS КБ':>8} {'расхождений':>12}")
+    for r in results:
+        print(f"  {r['engine']:<8} {r['ms_per_page']:8.3f} {r['total_ms']:9.1f} "
+              f"{r['rss_growth_kb']:8d} {r['max_rss_kb']:8d} {r['mismatches']:>12}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарки приложения")
+    ap.add_argument('--scale', type=int, nargs='+', default=[1],
+                    help="во сколько раз размножить юнитов (например, 1 10 100 1000)")
+    ap.add_argument('--seed', type=int, default=0, help="зерно синтетических данных")
+    ap.add_argument('--min-time', type=float, default=0.5, help="секунд на каждый микробенчмарк")
+    ap.add_argument('--http', action='store_true', help="нагрузить gunicorn по HTTP")
+    ap.add_argument('--workers', type=int, default=2, help="воркеров gunicorn")
+    ap.add_argument('--duration', type=float, default=10.0, help="секунд нагрузки на каждый набор")
+    ap.add_argument('--concurrency', type=int, default=8, help="одновременных клиентов")
+    ap.add_argument('--parse', metavar='PATH', nargs='?', const=PARSE_FIXTURES,
+                    help="вместо данных — разбор сохранённых страниц вики "
+                         "(кэш парсера или папка с HTML; по умолчанию fixtures/pages)")
+    ap.add_argument('--json', help="сохранить результаты в JSON-файл")
+    args = ap.parse_args()
+
+    if args.parse:
+        pages = load_pages(args.parse)
+        if not pages:
+            ap.error(f"В {args.parse} нет страниц")
+        report = bench_parse(pages, args.min_time)
+        print_parse(args.parse, report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'python': sys.version.split()[0], 'parse': report}, f, ensure_ascii=False, indent=2)
+            print(f"\n✓ Результаты: {args.json}")
+        return
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scale:
+            path = os.path.join(tmp, f"units-x{scale}.csv")
+            units = synthetic_csv(scale, path, args.seed)
+            data = bench_data(path, args.min_time)
+            print_data(scale, units, data)
+            entry = {
+                'scale': scale,
+                'units': units,
+                'data': [{'name': n, 'ms': s * 1000, 'runs': r} for n, s, r in data],
+            }
+            if args.http:
+                entry['http'] = bench_http(path, args.workers, args.duration, args.concurrency)
+                print_http(scale, entry['http'], args.workers, args.concurrency)
+            report.append(entry)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'cpus': os.cpu_count(), 'runs': report},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Результаты: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Типизированное колоночное представление юнитов.
+Строится один раз при загрузке: числа — массивы NumPy с маской пропусков,
+категориальные колонки — словарное кодирование.
+"""
+
+import re
+
+import numpy as np
+
+# Колонки, которые разбираем как числа ("80%" → 80, "60 / 20" → 60)
+NUMERIC_COLUMNS = (
+    'Уровень', 'Здоровье', 'Броня', 'Урон', 'Инициатива', 'Цена',
+    'Опыт за убийство', 'Опыт до апгрейда', 'Регенерация',
+    'Шанс попадания', 'Кол-во целей',
+)
+
+# Колонки с небольшим набором повторяющихся значений
+CATEGORICAL_COLUMNS = (
+    'Атака', 'Источник', 'Дальность', 'Класс атаки', 'Защита', 'Иммунитет',
+)
+
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+NULL_VALUES = ('', '—', 'Unknown', 'Max', 'Нет данных')
+
+
+def parse_number(value):
+    """Первое число в строке или None: '80%' → 80.0, '60 / 20' → 60.0"""
+    value = (value or '').strip()
+    if value in NULL_VALUES:
+        return None
+    m = NUMBER_RE.search(value)
+    return float(m.group()) if m else None
+
+
+class NumericColumn:
+    """Числовая колонка: values (float64) и mask (True там, где значение есть)"""
+
+    kind = 'num'
+
+    def __init__(self, name, raw):
+        parsed = [parse_number(v) for v in raw]
+        self.name = name
+        self.mask = np.array([v is not None for v in parsed], dtype=bool)
+        self.values = np.array([np.nan if v is None else v for v in parsed], dtype=np.float64)
+        self.values.flags.writeable = False
+        self.mask.flags.writeable = False
+
+    @classmethod
+    def from_values(cls, name, values):
+        """Колонка из готового массива (NaN — пропуск), например производный показатель"""
+        column = cls.__new__(cls)
+        column.name = name
+        column.values = np.array(values, dtype=np.float64)
+        column.mask = ~np.isnan(column.values)
+        column.values.flags.writeable = False
+        column.mask.flags.writeable = False
+        return column
+
+    def __len__(self):
+        return len(self.values)
+
+    def equals(self, value):
+        """
+        Маска строк, где число совпадает с первым числом в value.
+        Пустое value — строки без значения; value без числа не совпадает ни с чем.
+        """
+        if not (value or '').strip():
+            return ~self.mask
+        number = parse_number(value)
+        if number is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.mask & (self.values == number)
+
+    def filled(self, fill=0.0):
+        """Значения с пропусками, заменёнными на fill"""
+        return np.where(self.mask, self.values, fill)
+
+    def argsort(self, descending=False):
+        """Порядок строк по значению; пропуски всегда в конце"""
+        keys = -self.values if descending else self.values
+        # NaN при сортировке NumPy уходит в конец в обоих случаях
+        return np.argsort(keys, kind='stable')
+
+    def display(self):
+        """Значения для атрибутов data-* в HTML ('' для пропусков)"""
+        return ['' if not ok else f"{v:g}" for v, ok in zip(self.values.tolist(), self.mask.tolist())]
+
+
+class CategoricalColumn:
+    """Словарная колонка: codes (int32, -1 — пусто) и список categories"""
+
+    kind = 'cat'
+
+    def __init__(self, name, raw):
+        categories = sorted({v.strip() for v in raw if (v or '').strip() not in NULL_VALUES},
+                            key=str.lower)
+        index = {c: i for i, c in enumerate(categories)}
+        self.name = name
+        self.categories = tuple(categories)
+        self._index = index
+        self.codes = np.array([index.get((v or '').strip(), -1) for v in raw], dtype=np.int32)
+        self.codes.flags.writeable = False
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def mask(self):
+        return self.codes >= 0
+
+    def code(self, value):
+        """Код категории или -1, если такого значения нет"""
+        return self._index.get((value or '').strip(), -1)
+
+    def equals(self, value):
+        """
+        Маска строк с данным значением: пустое value — строки без значения,
+        неизвестное — ни одной строки.
+        """
+        if not (value or '').strip():
+            return ~self.mask
+        code = self.code(value)
+        if code < 0:
+            return np.zeros(len(self), dtype=bool)
+        return self.codes == code
+
+    def argsort(self, descending=False):
+        """Категории уже отсортированы, поэтому порядок кодов = порядок значений"""
+        keys = self.codes.astype(np.float64)
+        keys[self.codes < 0] = np.nan
+        if descending:
+            keys = -keys
+        return np.argsort(keys, kind='stable')
+
+
+class UnitDataset:
+    """Набор типизированных колонок одинаковой длины"""
+
+    def __init__(self, size, columns):
+        self.size = size
+        self.columns = columns
+
+    @classmethod
+    def from_units(cls, units):
+        columns = {}
+        for name in NUMERIC_COLUMNS:
+            columns[name] = NumericColumn(name, [u.get(name, '') for u in units])
+        for name in CATEGORICAL_COLUMNS:
+            columns[name] = CategoricalColumn(name, [u.get(name, '') for u in units])
+        return cls(len(units), columns)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def add(self, column):
+        """Добавить колонку (производные показатели считаются после загрузки)"""
+        if len(column) != self.size:
+            raise ValueError(f"Длина колонки {column.name}: {len(column)}, ожидалось {self.size}")
+        self.columns[column.name] = column
+
+    def argsort(self, name, descending=False):
+        return self.columns[name].argsort(descending)
+
+    def where(self, conditions):
+        """Маска строк, где все колонки равны значениям: [(колонка, значение), ...]"""
+        mask = np.ones(self.size, dtype=bool)
+        for name, value in conditions:
+            mask &= self.columns[name].equals(value)
+        return mask
+
+    def sort_values(self):
+        """Числовые значения для клиентской сортировки: {колонка: [str, ...]}"""
+        return {name: col.display() for name, col in self.columns.items()
+                if col.kind == 'num'}
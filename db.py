@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Хранилище юнитов всех рас в SQLite (режим WAL).
+Несколько воркеров gunicorn читают базу одновременно, парсер обновляет
+отдельные строки. CSV остаётся форматом импорта/экспорта:
+
+    python db.py import empire_units.csv --faction Империя
+    python db.py export units.csv [--faction Империя]
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+
+DEFAULT_DB = os.path.join(os.path.dirname(__file__), 'units.db')
+DEFAULT_FACTION = 'Империя'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id         INTEGER PRIMARY KEY,
+    faction    TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    name_en    TEXT NOT NULL DEFAULT '',
+    url        TEXT NOT NULL UNIQUE,
+    level      INTEGER,
+    source     TEXT NOT NULL DEFAULT '',
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS units_faction ON units (faction);
+CREATE INDEX IF NOT EXISTS units_level ON units (level);
+CREATE INDEX IF NOT EXISTS units_source ON units (source);
+CREATE INDEX IF NOT EXISTS units_name ON units (name);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+LEVEL_RE = re.compile(r'\d+')
+
+
+def connect(path=DEFAULT_DB, readonly=False):
+    """Соединение с базой; при создании включаем WAL и создаём схему"""
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    else:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def watch_paths(path=DEFAULT_DB):
+    """Файлы, по которым видно изменение базы (в режиме WAL запись идёт в -wal)"""
+    return (path, path + '-wal')
+
+
+def get_columns(conn):
+    """Порядок колонок — как в исходном CSV, новые добавляются в конец"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+    return json.loads(row[0]) if row else []
+
+
+def parse_level(value):
+    m = LEVEL_RE.search(value or '')
+    return int(m.group()) if m else None
+
+
+def upsert_units(conn, units, faction=DEFAULT_FACTION, columns=None):
+    """
+    Вставить или обновить юнитов по url. Обновляются только переданные
+    строки, остальная база не трогается.
+    """
+    units = [dict(unit, faction=unit.get('faction') or faction) for unit in units]
+    known = get_columns(conn)
+    new_keys = list(columns or [])
+    for unit in units:
+        new_keys.extend(unit.keys())
+    merged = known + [k for k in dict.fromkeys(new_keys) if k not in known]
+
+    now = time.time()
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO units (faction, name, name_en, url, level, source, data, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                faction = excluded.faction,
+                name = excluded.name,
+                name_en = excluded.name_en,
+                level = excluded.level,
+                source = excluded.source,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            [
+                (
+                    unit['faction'],
+                    unit.get('name', ''),
+                    unit.get('name_en', ''),
+                    unit.get('url') or f"{faction}:{unit.get('name_en') or unit.get('name')}",
+                    parse_level(unit.get('Уровень')),
+                    unit.get('Источник', ''),
+                    json.dumps(unit, ensure_ascii=False),
+                    now,
+                )
+                for unit in units
+            ],
+        )
+        if merged != known:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('columns', ?)",
+                (json.dumps(merged, ensure_ascii=False),),
+            )
+    return len(units)
+
+
+def load_units(path=DEFAULT_DB, faction=None):
+    """Юниты из базы в том же виде, что и load_csv_data(): (колонки, юниты)"""
+    if not os.path.exists(path):
+        return [], []
+    conn = connect(path, readonly=True)
+    try:
+        columns = get_columns(conn)
+        if faction:
+            rows = conn.execute("SELECT data FROM units WHERE faction = ? ORDER BY id", (faction,))
+        else:
+            rows = conn.execute("SELECT data FROM units ORDER BY id")
+        units = []
+        for (data,) in rows:
+            unit = json.loads(data)
+            units.append({key: unit.get(key, '') for key in columns})
+    finally:
+        conn.close()
+    return columns, units
+
+
+def import_csv(csv_path, db_path=DEFAULT_DB, faction=DEFAULT_FACTION):
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        units = list(reader)
+        columns = reader.fieldnames or []
+    conn = connect(db_path)
+    try:
+        return upsert_units(conn, units, faction, columns)
+    finally:
+        conn.close()
+
+
+def export_csv(csv_path, db_path=DEFAULT_DB, faction=None):
+    columns, units = load_units(db_path, faction)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(units)
+    return len(units)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Импорт/экспорт юнитов между CSV и SQLite")
+    ap.add_argument('--db', default=os.environ.get('UNITS_DB', DEFAULT_DB), help="путь к базе")
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    imp = sub.add_parser('import', help="CSV → база (upsert по url)")
+    imp.add_argument('csv')
+    imp.add_argument('--faction', default=DEFAULT_FACTION)
+
+    exp = sub.add_parser('export', help="база → CSV")
+    exp.add_argument('csv')
+    exp.add_argument('--faction')
+
+    args = ap.parse_args()
+    if args.cmd == 'import':
+        count = import_csv(args.csv, args.db, args.faction)
+        print(f"✓ Импортировано юнитов: {count} ({args.faction}) → {args.db}")
+    else:
+        count = export_csv(args.csv, args.db, args.faction)
+        print(f"✓ Экспортировано юнитов: {count} → {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
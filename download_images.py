@@ -9,6 +9,9 @@ import requests
 import re
 from urllib.parse import unquote
 
+import atlas
+import thumbnails
+
 IMAGES_DIR = "images"
 CSV_FILE = "empire_units.csv"
 
@@ -96,6 +99,12 @@ def main():
     print(f"\n✓ CSV обновлён: {CSV_FILE}")
     print(f"✓ Изображения сохранены в: {IMAGES_DIR}/")
 
+    # Превью и атлас иконок пересобираем вместе с картинками
+    built = thumbnails.build(force=True)
+    print(f"✓ Превью обновлены: {built} файлов")
+    if atlas.build():
+        print("✓ Атлас иконок пересобран")
+
 
 if __name__ == "__main__":
     main()
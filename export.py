@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Экспорт сайта в статический бандл: /, /tree, JSON по каждому юниту,
+CSS/JS и картинки.
+Результат можно отдавать nginx или любым статическим хостингом без Python.
+
+    python export.py --out dist
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from app import IMAGES_DIR, assets, images, render_table, render_tree, store, unit_json
+from pages import compress
+
+# Эти типы файлов сохраняем рядом со сжатыми копиями .gz/.br
+COMPRESSIBLE = ('.html', '.json', '.css', '.js', '.svg')
+
+
+def write_file(root, rel_path, data, manifest):
+    """Записать файл бандла, его сжатые копии и отпечаток в манифест"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if rel_path.endswith(COMPRESSIBLE):
+        for encoding, body in compress(data, gzip_level=9, brotli_quality=11).items():
+            ext = '.gz' if encoding == 'gzip' else '.br'
+            with open(path + ext, 'wb') as f:
+                f.write(body)
+    manifest[rel_path] = hashlib.sha256(data).hexdigest()
+
+
+def replaceable(path):
+    """--out можно занять: её нет, она пустая или там бандл прошлой сборки (наш manifest.json)"""
+    if not os.path.lexists(path):
+        return True
+    if not os.path.isdir(path) or os.path.islink(path):
+        return False
+    if not os.listdir(path):
+        return True
+    try:
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(manifest, dict) and 'build' in manifest and 'files' in manifest
+
+
+def build(out_dir):
+    out_dir = os.path.abspath(out_dir)
+    # Папку --out удаляем целиком, поэтому заменяем только свой прошлый бандл
+    if not replaceable(out_dir):
+        raise SystemExit(f"{out_dir} уже существует и это не бандл export.py "
+                         f"(нет manifest.json) — укажите пустую или новую папку")
+    snap = store.get()
+    if not snap:
+        raise SystemExit("Нет данных — запустите python parser.py")
+
+    # Собираем во временную папку рядом и подменяем готовый бандл целиком
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}.", dir=parent)
+    # mkdtemp создаёт папку только для владельца, а бандл читает веб-сервер
+    os.chmod(tmp_dir, 0o755)
+    try:
+        build_id, count = write_bundle(snap, tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return build_id, count
+
+
+def write_bundle(snap, tmp_dir):
+    """Все файлы бандла и manifest.json в tmp_dir: (отпечаток сборки, файлов)"""
+    manifest = {}
+
+    write_file(tmp_dir, 'index.html', render_table(snap), manifest)
+    write_file(tmp_dir, 'tree/index.html', render_tree(snap), manifest)
+    for unit in snap.units:
+        write_file(tmp_dir, f"api/units/{unit['name']}.json", unit_json(unit), manifest)
+
+    # CSS и JS — под теми же именами с хэшем, что и в страницах
+    for filename, page in sorted(assets.files().items()):
+        write_file(tmp_dir, f"assets/{filename}", page.body, manifest)
+
+    # Картинки вместе с превью — по тем же адресам с хэшем, что и в страницах
+    for rel_path, digest in sorted(images.files().items()):
+        with open(os.path.join(IMAGES_DIR, rel_path), 'rb') as f:
+            write_file(tmp_dir, f"images/{digest}/{rel_path}", f.read(), manifest)
+
+    # Отпечаток всего бандла — хэш от отпечатков всех файлов
+    digest = hashlib.sha256()
+    for rel_path in sorted(manifest):
+        digest.update(f"{rel_path}:{manifest[rel_path]}\n".encode('utf-8'))
+    build_id = digest.hexdigest()[:16]
+    write_file(tmp_dir, 'manifest.json', json.dumps(
+        {'build': build_id, 'units': len(snap.units), 'files': manifest},
+        ensure_ascii=False, indent=2, sort_keys=True), {})
+    return build_id, len(manifest)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--out', default='dist', help="папка для бандла (по умолчанию dist)")
+    args = ap.parse_args()
+
+    build_id, count = build(args.out)
+    print(f"✓ Бандл {build_id}: {count} файлов в {args.out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Загрузка страниц вики для парсера.
+Одна requests.Session с пулом keep-alive соединений на все потоки,
+ограничение частоты запросов к каждому хосту (token bucket) вместо
+фиксированной паузы и пул потоков: пока одни страницы качаются,
+другие уже разбираются.
+Ответы кэшируются на диске вместе с ETag/Last-Modified; повторный запуск
+спрашивает сервер «изменилось ли» и на 304 берёт тело из кэша,
+а в режиме offline вообще не ходит в сеть.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_WORKERS = 8
+# Не больше DEFAULT_RATE запросов в секунду к одному хосту, пачкой — до DEFAULT_BURST
+DEFAULT_RATE = 4.0
+DEFAULT_BURST = 4
+TIMEOUT = 30
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.http_cache')
+
+
+class OfflineMiss(Exception):
+    """В режиме offline страницы нет в кэше"""
+
+
+class HttpCache:
+    """
+    Ответы на диске: <sha256 адреса>.json — заголовки для условного запроса,
+    <sha256 адреса>.body — тело как есть.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, ext):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def get(self, url):
+        """(метаданные, тело) или None, если адреса нет в кэше"""
+        try:
+            with open(self._path(url, 'json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(url, 'body'), 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, response):
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_type': response.headers.get('Content-Type'),
+            'encoding': response.encoding or response.apparent_encoding,
+            'fetched_at': time.time(),
+        }
+        # Сначала тело, потом метаданные: по метаданным без тела кэш не отвечает
+        for ext, data in (('body', response.content),
+                          ('json', json.dumps(meta, ensure_ascii=False).encode('utf-8'))):
+            path = self._path(url, ext)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return meta
+
+    def touch(self, url, meta, response):
+        """304: тело прежнее, обновляем время проверки и, если прислали, валидаторы"""
+        meta = dict(meta, fetched_at=time.time())
+        for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+            if response.headers.get(header):
+                meta[key] = response.headers[header]
+        path = self._path(url, 'json')
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def decode(meta, body):
+        return body.decode(meta.get('encoding') or 'utf-8', errors='replace')
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst про запас"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Взять токен; если их нет — подождать, сколько нужно"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Отдельное ведро на каждый хост"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
+
+
+class Fetcher:
+    """Общая сессия с пулом соединений и ограничением частоты"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 headers=HEADERS, timeout=TIMEOUT, cache=None, offline=False):
+        if offline and cache is None:
+            raise ValueError("Режим offline работает только с кэшем")
+        self.workers = workers
+        self.cache = cache
+        self.offline = offline
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate, burst)
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        # Соединений в пуле — по числу потоков; 429/5xx повторяем с паузой
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests = 0
+        # Статистика кэша: не изменилось (304), взято без сети, скачано заново
+        self.not_modified = 0
+        self.offline_hits = 0
+        self.downloads = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, url, **kwargs):
+        """Ответ на GET с учётом ограничения частоты (ошибки HTTP — исключение)"""
+        if self.offline:
+            raise OfflineMiss(url)
+        self.limiter.acquire(url)
+        self._count('requests')
+        response = self.session.get(url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def text(self, url):
+        """Текст страницы: из кэша, если сервер ответил 304 (или мы offline)"""
+        if self.cache is None:
+            return self.get(url).text
+        cached = self.cache.get(url)
+        if self.offline:
+            if cached is None:
+                raise OfflineMiss(f"Нет в кэше: {url}")
+            self._count('offline_hits')
+            return HttpCache.decode(*cached)
+
+        headers = {}
+        if cached is not None:
+            meta, _ = cached
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        response = self.get(url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self._count('not_modified')
+            self.cache.touch(url, cached[0], response)
+            return HttpCache.decode(*cached)
+        self._count('downloads')
+        meta = self.cache.put(url, response)
+        return HttpCache.decode(meta, response.content)
+
+    def map(self, func, items):
+        """
+        Выполнить func(item) в пуле потоков; результаты — по мере готовности:
+        (индекс, item, результат, исключение или None)
+        """
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(func, item): (i, item) for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                i, item = futures[future]
+                try:
+                    yield i, item, future.result(), None
+                except Exception as e:
+                    yield i, item, None, e
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
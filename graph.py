@@ -0,0 +1,147 @@
+"""
+Древо развития юнитов как граф.
+Апгрейды и ветки хранятся в evolution.json; из них строится DAG
+(родители, потомки, глубина, ветки), а из DAG — раскладка страницы /tree.
+Новая раса добавляется правкой данных, без изменений в шаблоне.
+"""
+
+import json
+import os
+from collections import defaultdict, deque
+
+EVOLUTION_FILE = os.path.join(os.path.dirname(__file__), 'evolution.json')
+
+
+class EvolutionGraph:
+    """Ориентированный ациклический граф апгрейдов"""
+
+    def __init__(self, factions=(), upgrades=(), units=None):
+        self.factions = list(factions)
+        self.info = dict(units or {})
+        self.children = defaultdict(list)
+        self.parents = defaultdict(list)
+        nodes = dict.fromkeys(self.info)
+        for parent, child in upgrades:
+            self.children[parent].append(child)
+            self.parents[child].append(parent)
+            nodes.update(dict.fromkeys((parent, child)))
+
+        # Ветки, в которые входит каждый юнит (Сквайр — и в «Воинах», и в «Инквизиции»)
+        self.branches = defaultdict(list)
+        for faction in self.factions:
+            for branch in faction['branches']:
+                for name in branch['units']:
+                    nodes[name] = None
+                    self.branches[name].append(branch['title'])
+
+        self.nodes = tuple(nodes)
+        self.order = self._toposort()
+        self.depth = {}
+        for name in self.order:
+            self.depth[name] = max((self.depth[p] + 1 for p in self.parents[name]), default=0)
+
+    @classmethod
+    def load(cls, path=EVOLUTION_FILE):
+        """Граф из JSON-файла; если файла нет — пустой граф"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('factions', []), data.get('upgrades', []), data.get('units', {}))
+
+    def _toposort(self):
+        """Топологический порядок (алгоритм Кана); цикл в данных — ошибка"""
+        indegree = {name: len(self.parents[name]) for name in self.nodes}
+        queue = deque(name for name in self.nodes if indegree[name] == 0)
+        order = []
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            for child in self.children[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        if len(order) != len(self.nodes):
+            cycle = sorted(name for name, d in indegree.items() if d > 0)
+            raise ValueError(f"Цикл в древе апгрейдов: {', '.join(cycle)}")
+        return tuple(order)
+
+    def roots(self):
+        return [name for name in self.order if not self.parents[name]]
+
+    def descendants(self, name):
+        """Все юниты, в которые можно прокачать name"""
+        seen, stack = [], list(self.children[name])
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.append(node)
+                stack.extend(self.children[node])
+        return seen
+
+    def ancestors(self, name):
+        """Все юниты, из которых получается name"""
+        seen, stack = [], list(self.parents[name])
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.append(node)
+                stack.extend(self.parents[node])
+        return seen
+
+    def is_large(self, name):
+        """Большой юнит занимает две клетки отряда"""
+        return self.info.get(name, {}).get('size') == 'large'
+
+    def card(self, name, units_by_name):
+        """Данные карточки юнита для шаблона"""
+        info = self.info.get(name, {})
+        unit = units_by_name.get(name, {})
+        label = info.get('label')
+        if not label:
+            level = (unit.get('Уровень') or '').strip()
+            label = f"Ур.{level or self.depth.get(name, 0) + 1}"
+        return {
+            'name': name,
+            'short': info.get('short', name),
+            'label': label,
+            'image_url': unit.get('image_url', ''),
+        }
+
+    def _line(self, name, members, units_by_name):
+        """
+        Цепочка апгрейдов от name внутри ветки: карточки подряд,
+        а на развилке — {'fork': [цепочка, цепочка, ...]}
+        """
+        items = [{'card': self.card(name, units_by_name)}]
+        kids = [c for c in self.children[name] if c in members]
+        while len(kids) == 1:
+            name = kids[0]
+            items.append({'card': self.card(name, units_by_name)})
+            kids = [c for c in self.children[name] if c in members]
+        if kids:
+            items.append({'fork': [self._line(k, members, units_by_name) for k in kids]})
+        return items
+
+    def layout(self, units_by_name):
+        """Раскладка страницы /tree: расы → ветки → цепочки карточек"""
+        factions = []
+        for faction in self.factions:
+            branches = []
+            for branch in faction['branches']:
+                members = set(branch['units'])
+                root = branch.get('root')
+                if root:
+                    line, flat = self._line(root, members, units_by_name), False
+                else:
+                    # Ветка без корня — просто ряд карточек без стрелок
+                    line = [{'card': self.card(n, units_by_name)} for n in branch['units']]
+                    flat = True
+                branches.append({
+                    'title': branch['title'],
+                    'class': branch.get('class', ''),
+                    'line': line,
+                    'flat': flat,
+                })
+            factions.append({'faction': faction['faction'], 'branches': branches})
+        return factions
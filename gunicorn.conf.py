@@ -0,0 +1,141 @@
+"""
+Настройки gunicorn: данные загружаются один раз в мастере до fork.
+Мастер строит снимок (юниты, колонки NumPy, поисковый индекс, метрики)
+и рендерит страницы, затем замораживает сборщик мусора (gc.freeze),
+чтобы воркеры не трогали эти объекты и делили страницы памяти с мастером
+(copy-on-write). Крупные данные лежат в массивах NumPy и готовых байтах
+ответов, поэтому подсчёт ссылок при чтении почти не пишет в общую память.
+
+    gunicorn -c gunicorn.conf.py app:app
+    kill -HUP <pid мастера>      # перечитать данные и плавно заменить воркеров
+
+По HUP мастер собирает новый снимок, запускает новых воркеров и только
+потом гасит старых — запросы не теряются. Время запуска, перезагрузки
+и память каждого воркера (RSS, PSS, общая часть) пишутся в лог.
+
+Воркеры сами файлы данных не проверяют: после правки CSV или записи
+в базу (parser.py) нужно послать мастеру HUP. WORKER_CHECK_INTERVAL=5
+разрешает воркерам перечитывать изменившиеся данные самим, но каждый
+тогда строит свою копию снимка и общая с мастером память теряется
+до следующего HUP.
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+import time
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+# Как часто воркер проверяет файлы данных (секунды); по умолчанию — никогда, только HUP
+worker_check_interval = float(os.environ.get('WORKER_CHECK_INTERVAL', 'inf'))
+
+_started = time.perf_counter()
+
+# Без общей папки каждый воркер отдавал бы в /metrics только свои счётчики.
+# Папка своя у каждого сервера; задаётся до загрузки приложения (Monitor читает
+# METRICS_DIR при импорте). По HUP файл читается заново — папка остаётся прежней.
+if not os.environ.get('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='disciples-metrics-')
+    os.environ['METRICS_DIR_TEMPORARY'] = '1'
+
+# Пока мастер загружает данные, сборщик мусора не нужен. Отключаем здесь:
+# с preload_app gunicorn загружает приложение сразу после чтения этого файла,
+# раньше on_starting. Включается снова в when_ready после gc.freeze.
+# По HUP файл читается заново — перезагрузка тоже идёт без сборщика до on_reload.
+gc.disable()
+
+
+def memory_usage(pid):
+    """RSS, PSS и общая с другими процессами память (МБ) из /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return fields.get('Rss', 0), fields.get('Pss', 0), shared
+
+
+def format_memory(pid):
+    usage = memory_usage(pid)
+    if usage is None:
+        return "память: нет /proc"
+    rss, pss, shared = usage
+    return f"RSS {rss:.1f} МБ, PSS {pss:.1f} МБ, общей {shared:.1f} МБ"
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска. Папку Monitor создал ещё при загрузке
+    # приложения (она раньше on_starting), но свой файл мастер пишет только в when_ready
+    from monitoring import clear_directory
+    clear_directory(os.environ.get('METRICS_DIR'))
+
+
+def freeze_snapshot():
+    """
+    Собрать мусор (в том числе циклы старых снимков) и заморозить
+    всё оставшееся: воркеры получат его в «вечном» поколении и их
+    сборщик мусора не будет обходить и переписывать эти объекты
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def when_ready(server):
+    from app import monitor, store, warm_cache
+    count = warm_cache()
+    # Загрузка и прогрев кэша в мастере — в его файле метрик, воркеры их не повторяют
+    monitor.flush()
+    freeze_snapshot()
+    gc.enable()
+    server.log.info("Данные загружены в мастере за %.2f с: версия %s, %d юнитов, %d ответов в кэше; %s",
+                    time.perf_counter() - _started, store.version, len(store.get().units),
+                    count, format_memory(os.getpid()))
+
+
+def on_reload(server):
+    """HUP: новый снимок в мастере; gunicorn затем запускает новых воркеров и гасит старых"""
+    from app import monitor, store, warm_cache
+    started = time.perf_counter()
+    # Прежний снимок заморожен — размораживаем, чтобы сборщик мог его освободить
+    gc.unfreeze()
+    store.reload(force=True)
+    warm_cache()
+    monitor.flush()
+    freeze_snapshot()
+    gc.enable()
+    server.log.info("Данные перечитаны за %.2f с: версия %s",
+                    time.perf_counter() - started, store.version)
+
+
+def post_fork(server, worker):
+    from app import monitor, store
+    # Счётчики мастера уже в его файле: воркер считает только своё
+    monitor.reset()
+    # Снимок обновляет мастер по HUP (см. WORKER_CHECK_INTERVAL в начале файла)
+    store.check_interval = worker_check_interval
+
+
+def child_exit(server, worker):
+    """Метрики завершившегося воркера — в общую сводку, его файл больше не нужен"""
+    from app import monitor
+    monitor.fold(worker.pid)
+
+
+def on_exit(server):
+    """Временную папку метрик убираем за собой"""
+    if os.environ.get('METRICS_DIR_TEMPORARY'):
+        from app import monitor
+        monitor.close()
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def post_worker_init(worker):
+    worker.log.info("Воркер %s готов: %s", worker.pid, format_memory(worker.pid))
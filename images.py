@@ -0,0 +1,259 @@
+"""
+Картинки юнитов: превью и спрайт-атлас для таблицы и карточек древа,
+адреса с хэшем содержимого и кэш горячих картинок в памяти.
+Превью лежат в images/thumbs/<размер>/, атлас — в images/atlas/:
+    python thumbnails.py
+    python atlas.py
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# Размеры превью (px): 32 — иконки таблицы и древа, 64 — они же на retina
+THUMB_SIZES = (32, 64)
+THUMBS_DIR = 'thumbs'
+
+# Атлас: одна картинка со всеми иконками (32 px и 64 px для retina)
+ATLAS_DIR = 'atlas'
+ATLAS_SIZES = (32, 64)
+ATLAS_MAP = 'atlas.json'
+
+# Длина хэша в адресе: /images/<хэш>/Ангел.png
+DIGEST_LENGTH = 12
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+def thumb_path(images_dir, size, filename):
+    return os.path.join(images_dir, THUMBS_DIR, str(size), filename)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:DIGEST_LENGTH]
+
+
+def atlas_file(size):
+    return f"{ATLAS_DIR}/atlas-{size}.png"
+
+
+def is_digest(value):
+    return len(value) == DIGEST_LENGTH and set(value) <= HEX_DIGITS
+
+
+def rel_path_from_url(image_url):
+    """'/images/Ангел.png', 'images/Ангел.png' или адрес с хэшем → 'Ангел.png'"""
+    path = image_url.lstrip('/')
+    if path.startswith('images/'):
+        path = path[len('images/'):]
+    head, _, rest = path.partition('/')
+    if rest and is_digest(head):
+        path = rest
+    return path
+
+
+class ImageCatalog:
+    """
+    Список картинок с хэшами содержимого и собранными превью.
+    Хэш пересчитывается только для файлов, у которых изменились mtime/размер.
+    """
+
+    def __init__(self, images_dir):
+        self.images_dir = images_dir
+        self._digests = {}
+        self._stat_cache = {}
+        self.refresh()
+
+    def _scan(self):
+        """{относительный путь: (mtime, размер)} всех файлов папки"""
+        stats = {}
+        for dirpath, _, filenames in os.walk(self.images_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # файл удалили, пока обходили папку
+                rel_path = os.path.relpath(path, self.images_dir).replace(os.sep, '/')
+                stats[rel_path] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def stat_key(self):
+        """
+        Состояние папки без чтения файлов: хранилище данных следит за ним,
+        чтобы заменённая на диске картинка получила новый хэш и адрес
+        """
+        return hash(frozenset(self._scan().items()))
+
+    def refresh(self):
+        """Пересканировать папку картинок (вызывается при перезагрузке данных)"""
+        digests = {}
+        stat_cache = {}
+        for rel_path, key in self._scan().items():
+            cached = self._stat_cache.get(rel_path)
+            if cached and cached[0] == key:
+                digest = cached[1]
+            else:
+                digest = file_digest(os.path.join(self.images_dir, rel_path))
+            digests[rel_path] = digest
+            stat_cache[rel_path] = (key, digest)
+        self._digests = digests
+        self._stat_cache = stat_cache
+
+    def files(self):
+        """Все картинки: {относительный путь: хэш}"""
+        return dict(self._digests)
+
+    def source_digest(self):
+        """Отпечаток набора исходных картинок (без превью и атласа)"""
+        h = hashlib.sha256()
+        for rel_path in sorted(self._digests):
+            if '/' not in rel_path:
+                h.update(f"{rel_path}:{self._digests[rel_path]}\n".encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    def url(self, rel_path):
+        """Адрес картинки с хэшем содержимого (или обычный, если файла нет)"""
+        digest = self._digests.get(rel_path)
+        if digest is None:
+            return f"/images/{rel_path}"
+        return f"/images/{digest}/{rel_path}"
+
+    def rewrite(self, image_url):
+        """Переписать image_url из CSV в адрес с хэшем"""
+        if not image_url:
+            return image_url
+        return self.url(rel_path_from_url(image_url))
+
+    def resolve(self, digest, rel_path):
+        """Путь к файлу, если хэш в адресе совпадает с текущим содержимым"""
+        if self._digests.get(rel_path) != digest:
+            return None
+        return os.path.join(self.images_dir, rel_path)
+
+    def thumb_url(self, image_url, size):
+        """URL превью нужного размера или исходной картинки, если превью нет"""
+        if not image_url:
+            return ''
+        # Превью всегда в PNG, даже если исходник — GIF
+        filename = os.path.splitext(image_url.rsplit('/', 1)[-1])[0] + '.png'
+        rel_path = f"{THUMBS_DIR}/{size}/{filename}"
+        if rel_path in self._digests:
+            return self.url(rel_path)
+        return image_url
+
+    def img_attrs(self, image_url, size=32):
+        """Атрибуты src/srcset для <img>: превью 1x и вдвое большее для 2x"""
+        src = self.thumb_url(image_url, size)
+        hi = self.thumb_url(image_url, size * 2)
+        if src == hi:
+            return Markup('src="%s"') % src
+        return Markup('src="%s" srcset="%s 1x, %s 2x"') % (src, src, hi)
+
+
+class SpriteAtlas:
+    """
+    Иконки из одного спрайт-атласа вместо отдельной картинки на юнита.
+    Позиции задаются в процентах, поэтому одна и та же ячейка подходит
+    для иконок любого размера (32 px в таблице, 24 px в древе).
+    Если атлас не собран или устарел, icon() отдаёт обычный <img>.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.cells = {}
+        self._css = Markup('')
+        self.refresh()
+
+    def refresh(self):
+        """Перечитать карту атласа; устаревший атлас не используем"""
+        self.cells = {}
+        self._css = Markup('')
+        path = os.path.join(self.catalog.images_dir, ATLAS_DIR, ATLAS_MAP)
+        try:
+            with open(path, encoding='utf-8') as f:
+                atlas = json.load(f)
+        except (OSError, ValueError):
+            return
+        if atlas.get('source') != self.catalog.source_digest():
+            return
+        cols, rows = atlas['cols'], atlas['rows']
+        self.cells = {filename: i for i, filename in enumerate(atlas['files'])}
+
+        def pct(pos, count):
+            return 0 if count < 2 else round(pos * 100 / (count - 1), 4)
+
+        url_1x = self.catalog.url(atlas_file(ATLAS_SIZES[0]))
+        url_2x = self.catalog.url(atlas_file(ATLAS_SIZES[1]))
+        lines = [
+            ".sprite { display: inline-block; background-repeat: no-repeat;"
+            f" background-image: url('{url_1x}');"
+            f" background-image: image-set(url('{url_1x}') 1x, url('{url_2x}') 2x);"
+            f" background-size: {cols * 100}% {rows * 100}%; }}"
+        ]
+        for i in range(len(self.cells)):
+            col, row = i % cols, i // cols
+            lines.append(f".s-{i} {{ background-position: {pct(col, cols):g}% {pct(row, rows):g}%; }}")
+        self._css = Markup('\n'.join(lines))
+
+    def css(self):
+        """CSS с координатами всех иконок атласа"""
+        return self._css
+
+    def icon(self, image_url, size=32):
+        """Иконка юнита: ячейка атласа или <img> с превью, если атласа нет"""
+        if not image_url:
+            return Markup('')
+        filename = image_url.rsplit('/', 1)[-1]
+        index = self.cells.get(filename)
+        if index is None:
+            return Markup('<img %s alt="">') % self.catalog.img_attrs(image_url, size)
+        return Markup('<span class="sprite s-%d" role="img"></span>') % index
+
+
+class ImageCache:
+    """LRU горячих картинок в памяти, ограниченный суммарным размером"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, path):
+        """
+        Содержимое файла по ключу (хэш + путь, чтобы изменённый файл
+        не отдавался из кэша); с диска читаем только при промахе
+        """
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) > self.max_bytes:
+            return data
+
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = data
+                self.size += len(data)
+            while self.size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.size -= len(old)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
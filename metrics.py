@@ -0,0 +1,180 @@
+"""
+Производные показатели юнитов: урон за ход, урон на золото,
+эффективное здоровье, лечение, окупаемость опыта.
+Считаются векторно по колонкам UnitDataset сразу для всех юнитов,
+один раз на версию данных — вместе со снимком.
+Набор показателей — список Metric; новый показатель добавляется одной строкой
+(если формула читает другие показатели — с их именами в requires).
+"""
+
+import numpy as np
+
+from dataset import NumericColumn
+
+# Броня в Disciples II не снижает урон больше чем на 90%
+MAX_ARMOR = 90.0
+
+# Атаки, которые лечат, а не наносят урон
+HEAL_ATTACKS = ('лечение', 'исцеление')
+
+
+class Metric:
+    """
+    Производная колонка: имя в таблице, описание и формула над колонками.
+    requires — показатели, которые формула читает по имени; они считаются
+    и тогда, когда сами в таблицу не выбраны.
+    """
+
+    __slots__ = ('name', 'description', 'formula', 'digits', 'requires')
+
+    def __init__(self, name, description, formula, digits=1, requires=()):
+        self.name = name
+        self.description = description
+        self.formula = formula
+        self.digits = digits
+        self.requires = tuple(requires)
+
+
+class Inputs:
+    """
+    Колонки для формул: c['Урон'] — float64 с NaN на месте пропусков.
+    Уже посчитанные показатели доступны по своему имени.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.computed = {}
+
+    def __getitem__(self, name):
+        if name in self.computed:
+            return self.computed[name]
+        return self.dataset[name].values
+
+    def percent(self, name):
+        """'80%' → 0.8"""
+        return self[name] / 100.0
+
+    def contains(self, name, words):
+        """Маска строк, где текстовая колонка содержит одно из слов"""
+        column = self.dataset[name]
+        codes = [i for i, value in enumerate(column.categories)
+                 if any(w in value.lower() for w in words)]
+        return np.isin(column.codes, codes)
+
+
+def positive(values):
+    """Нули и отрицательные значения — как пропуск (чтобы не делить на ноль)"""
+    return np.where(values > 0, values, np.nan)
+
+
+def per_gold(values, cost):
+    """Показатель на 100 золота"""
+    return values / positive(cost) * 100.0
+
+
+def effective_hp(c):
+    """Здоровье с учётом брони: урон по юниту снижается на Броня %"""
+    armor = np.clip(np.nan_to_num(c['Броня']), 0.0, MAX_ARMOR)
+    return c['Здоровье'] / (1.0 - armor / 100.0)
+
+
+def healing(c):
+    """Лечение за ход: сила лечения × число целей, только у лекарей"""
+    healer = c.contains('Атака', HEAL_ATTACKS)
+    return np.where(healer, c['Урон'] * c['Кол-во целей'], np.nan)
+
+
+METRICS = (
+    Metric('Урон/ход', "Урон × число целей × шанс попадания",
+           lambda c: c['Урон'] * c['Кол-во целей'] * c.percent('Шанс попадания')),
+    Metric('Урон/100 зол.', "Ожидаемый урон за ход на 100 золота цены",
+           lambda c: per_gold(c['Урон/ход'], c['Цена']), requires=('Урон/ход',)),
+    Metric('Эфф. HP', "Здоровье с учётом брони",
+           effective_hp, digits=0),
+    Metric('Эфф. HP/100 зол.', "Эффективное здоровье на 100 золота цены",
+           lambda c: per_gold(c['Эфф. HP'], c['Цена']), requires=('Эфф. HP',)),
+    Metric('Лечение/ход', "Сила лечения × число целей",
+           healing, digits=0),
+    Metric('XP: убийств до апгрейда', "Опыт до апгрейда / опыт за убийство такого же юнита",
+           lambda c: c['Опыт до апгрейда'] / positive(c['Опыт за убийство'])),
+)
+
+
+def select(names, metrics=METRICS):
+    """Подмножество показателей по именам (порядок — как в METRICS)"""
+    wanted = set(names)
+    unknown = wanted - {m.name for m in metrics}
+    if unknown:
+        raise ValueError(f"Неизвестные показатели: {', '.join(sorted(unknown))}")
+    return tuple(m for m in metrics if m.name in wanted)
+
+
+def with_requirements(metrics, known=METRICS):
+    """
+    Показатели вместе со всем, что читают их формулы, — зависимости раньше
+    зависимых. Зависимости ищутся среди metrics и known.
+    """
+    by_name = {m.name: m for m in known}
+    by_name.update((m.name, m) for m in metrics)
+    ordered, seen = [], set()
+
+    def visit(metric, path):
+        if metric.name in seen:
+            return
+        if metric.name in path:
+            raise ValueError(f"Показатели зависят друг от друга по кругу: {metric.name}")
+        for name in metric.requires:
+            if name not in by_name:
+                raise ValueError(f"Показатель {metric.name} требует неизвестный показатель {name}")
+            visit(by_name[name], path | {metric.name})
+        seen.add(metric.name)
+        ordered.append(metric)
+
+    for metric in metrics:
+        visit(metric, frozenset())
+    return tuple(ordered)
+
+
+class MetricTable:
+    """Посчитанные показатели снимка: колонки NumericColumn в порядке metrics"""
+
+    def __init__(self, metrics, columns):
+        self.metrics = tuple(metrics)
+        self.columns = columns
+
+    @classmethod
+    def compute(cls, dataset, metrics=METRICS):
+        """Посчитать metrics; невыбранные зависимости считаются, но в таблицу не попадают"""
+        metrics = tuple(metrics)
+        wanted = {m.name for m in metrics}
+        inputs = Inputs(dataset)
+        columns = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for metric in with_requirements(metrics):
+                values = np.asarray(metric.formula(inputs), dtype=np.float64)
+                values = np.where(np.isfinite(values), values, np.nan).round(metric.digits)
+                inputs.computed[metric.name] = values
+                if metric.name in wanted:
+                    columns[metric.name] = NumericColumn.from_values(metric.name, values)
+        return cls(metrics, columns)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __iter__(self):
+        return iter(self.metrics)
+
+    def visible(self):
+        """Показатели, у которых есть хотя бы одно значение (пустые колонки не выводим)"""
+        return [m for m in self.metrics if self.columns[m.name].mask.any()]
+
+    def value(self, name, i):
+        """Значение показателя для юнита i (None — нет данных)"""
+        column = self.columns[name]
+        return column.values[i].item() if column.mask[i] else None
+
+    def row(self, i):
+        return {m.name: self.value(m.name, i) for m in self.metrics}
+
+    def describe(self):
+        return [{'name': m.name, 'description': m.description} for m in self.metrics]
@@ -0,0 +1,289 @@
+"""
+Метрики приложения в текстовом формате Prometheus (/metrics).
+Каждый процесс считает в памяти: число запросов, гистограммы задержек,
+отданные байты по маршрутам, плюс счётчики, которые снимаются с объектов
+(кэши страниц и картинок, перезагрузки данных).
+С gunicorn у каждого воркера свои счётчики: процесс не чаще раза в секунду
+сбрасывает их в METRICS_DIR/<pid>.json, а /metrics складывает файлы всех
+процессов. Воркер после fork вызывает reset(): всё, что он унаследовал
+от мастера (кэши, перезагрузки данных при preload), уже посчитано в файле
+мастера, поэтому воркер отдаёт только прирост со своего старта.
+Файл завершившегося воркера мастер вливает в общий exited.json (fold),
+чтобы счётчики не убывали, а папка не росла; при запуске сервера папку
+нужно очищать (clear_directory).
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+EXITED_FILE = 'exited.json'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Описание метрик: тип и подсказка. Значения gauge при сложении процессов берём по максимуму
+METRICS = {
+    'http_requests_total': ('counter', "Запросы по маршруту, методу и статусу"),
+    'http_request_duration_seconds': ('histogram', "Время обработки запроса"),
+    'http_response_bytes_total': ('counter', "Отдано байт тела ответа"),
+    'data_reloads_total': ('counter', "Перезагрузки снимка данных"),
+    'data_reload_duration_seconds_total': ('counter', "Суммарное время перезагрузок данных"),
+    'data_version': ('gauge', "Версия снимка данных"),
+    'data_units': ('gauge', "Юнитов в текущем снимке"),
+    'cache_hits_total': ('counter', "Попадания в кэш"),
+    'cache_misses_total': ('counter', "Промахи кэша"),
+}
+
+
+def clear_directory(directory):
+    """Удалить файлы прошлых запусков (вызывается в мастере до старта воркеров)"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+
+def is_counter(name):
+    return METRICS.get(name, ('counter',))[0] == 'counter'
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Monitor:
+    """
+    Реестр метрик процесса.
+    inc/observe — из обработчиков запросов; collector — функция,
+    возвращающая текущие значения счётчиков объекта: [(имя, {метки}, значение)].
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0, buckets=LATENCY_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._values = defaultdict(float)
+        # Гистограмма: счётчики по корзинам (без накопления), затем сумма и число наблюдений
+        self._histograms = {}
+        self._collectors = []
+        # Значения счётчиков-сборщиков на момент reset(): их отдаём как прирост
+        self._baseline = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def inc(self, name, labels=None, value=1):
+        with self._lock:
+            self._values[(name, label_key(labels or {}))] += value
+
+    def observe(self, name, value, labels=None):
+        key = (name, label_key(labels or {}))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            hist[bisect_left(self.buckets, value)] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def collector(self, func):
+        """Зарегистрировать функцию сбора значений (можно как декоратор)"""
+        self._collectors.append(func)
+        return func
+
+    def _collect(self):
+        values = {}
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                values[(name, label_key(labels))] = value
+        return values
+
+    def reset(self):
+        """
+        Начать счёт заново (в воркере сразу после fork): унаследованные
+        значения запросов забываем, а для сборщиков запоминаем точку отсчёта
+        """
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+        self._baseline = {key: value for key, value in self._collect().items() if is_counter(key[0])}
+        self._flushed_at = 0.0
+
+    def state(self):
+        """Все значения процесса: {'values': [...], 'histograms': [...]}"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        for key, value in self._collect().items():
+            values[key] = value - self._baseline.get(key, 0)
+        return {
+            'buckets': list(self.buckets),
+            'values': [[name, list(labels), value] for (name, labels), value in values.items()],
+            'histograms': [[name, list(labels), hist] for (name, labels), hist in histograms.items()],
+        }
+
+    def maybe_flush(self):
+        """Сбросить значения в файл, если с прошлого раза прошло flush_interval"""
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def close(self):
+        """Больше не писать файл процесса (например, перед удалением папки)"""
+        if self.directory:
+            atexit.unregister(self.flush)
+            self.directory = None
+
+    def flush(self):
+        """Записать значения процесса в его файл (атомарно, через временный)"""
+        if not self.directory:
+            return
+        self._flushed_at = time.monotonic()
+        tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state(), f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # файл пишется прямо сейчас или удалён
+
+    def states(self):
+        """Значения всех процессов: свой — из памяти, остальных — из файлов"""
+        states = [self.state()]
+        if not self.directory:
+            return states
+        # Сначала сводка завершившихся: их собственные файлы, если ещё лежат, не считаем
+        exited = self._read(EXITED_FILE)
+        folded = set()
+        if exited is not None:
+            states.append(exited)
+            folded = {f"{pid}.json" for pid in exited.get('pids', ())}
+        own = os.path.basename(self.path)
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name in (own, EXITED_FILE) or name in folded:
+                continue
+            state = self._read(name)
+            if state is not None:
+                states.append(state)
+        return states
+
+    def fold(self, pid):
+        """
+        Влить файл завершившегося процесса в exited.json и удалить его
+        (вызывает только мастер, поэтому сводку пишет один процесс).
+        Значения gauge умершего процесса больше не нужны и отбрасываются.
+        """
+        if not self.directory:
+            return
+        name = f"{pid}.json"
+        state = self._read(name)
+        if state is None or tuple(state.get('buckets', ())) != self.buckets:
+            return
+        exited = self._read(EXITED_FILE) or {'buckets': list(self.buckets), 'values': [],
+                                             'histograms': [], 'pids': []}
+        values = {(n, tuple(map(tuple, labels))): v for n, labels, v in exited['values']}
+        for n, labels, v in state['values']:
+            if is_counter(n):
+                key = (n, tuple(map(tuple, labels)))
+                values[key] = values.get(key, 0) + v
+        histograms = {(n, tuple(map(tuple, labels))): h for n, labels, h in exited['histograms']}
+        for n, labels, hist in state['histograms']:
+            key = (n, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(hist))
+            for i, v in enumerate(hist):
+                total[i] += v
+        # Помним только те свёрнутые pid, чьи файлы ещё могут попасться читателю
+        pids = [p for p in exited.get('pids', ())
+                if os.path.exists(os.path.join(self.directory, f"{p}.json"))] + [pid]
+        exited = {
+            'buckets': list(self.buckets),
+            'values': [[n, list(labels), v] for (n, labels), v in values.items()],
+            'histograms': [[n, list(labels), h] for (n, labels), h in histograms.items()],
+            'pids': pids,
+        }
+        path = os.path.join(self.directory, EXITED_FILE)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(exited, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        os.remove(os.path.join(self.directory, name))
+
+    def merged(self):
+        """Сложить значения процессов (gauge — максимум)"""
+        values = {}
+        histograms = {}
+        for state in self.states():
+            if tuple(state.get('buckets', ())) != self.buckets:
+                continue
+            for name, labels, value in state['values']:
+                key = (name, tuple(map(tuple, labels)))
+                if not is_counter(name):
+                    values[key] = max(values.get(key, value), value)
+                else:
+                    values[key] = values.get(key, 0) + value
+            for name, labels, hist in state['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, [0] * len(hist))
+                for i, v in enumerate(hist):
+                    total[i] += v
+        return values, histograms
+
+    def render(self):
+        """Текстовый формат Prometheus по всем процессам"""
+        values, histograms = self.merged()
+        by_name = defaultdict(list)
+        for (name, labels), value in values.items():
+            by_name[name].append((labels, value))
+        for (name, labels), hist in histograms.items():
+            by_name[name].append((labels, hist))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = METRICS.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name]):
+                if kind != 'histogram':
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = format_value(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-2])}")
+                lines.append(f"{name}_count{format_labels(labels)} {format_value(value[-1])}")
+        return '\n'.join(lines) + '\n'
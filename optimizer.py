@@ -0,0 +1,140 @@
+"""
+Подбор отряда под бюджет: лучший состав по урону, живучести или лечению
+при ограничении по золоту (Цена) и числу клеток (большой юнит занимает две).
+Задача — рюкзак с двумя ограничениями и повторами; решается динамическим
+программированием сверху вниз с запоминанием подзадач. Подзадачи не зависят
+от бюджета запроса, поэтому оптимизатор живёт весь срок снимка данных
+и следующие запросы отвечают почти мгновенно.
+"""
+
+import threading
+
+import numpy as np
+
+from metrics import MetricTable, Inputs, select
+
+DEFAULT_SLOTS = 6
+
+OBJECTIVES = {
+    'damage': "Ожидаемый урон за ход (Урон/ход)",
+    'ehp': "Здоровье с учётом брони (Эфф. HP)",
+    'healing': "Сколько союзников лекари лечат за ход (не больше числа клеток отряда)",
+}
+OBJECTIVE_METRICS = {'damage': 'Урон/ход', 'ehp': 'Эфф. HP'}
+# Цели, которые не складываются без предела: вылечить больше союзников,
+# чем клеток в отряде, нельзя, сколько лекарей ни бери
+SATURATING = ('healing',)
+
+
+def objective_values(snap, objective, slots=DEFAULT_SLOTS):
+    """Вклад каждого юнита в цель (массив по юнитам снимка, пропуски — 0)"""
+    if objective == 'healing':
+        c = Inputs(snap.dataset)
+        healer = c.contains('Класс атаки', ('лечение',))
+        targets = np.minimum(np.nan_to_num(c['Кол-во целей'], nan=1.0), slots)
+        return np.where(healer, targets, 0.0)
+    name = OBJECTIVE_METRICS[objective]
+    if name in snap.metrics:
+        column = snap.metrics.columns[name]
+    else:
+        column = MetricTable.compute(snap.dataset, select([name])).columns[name]
+    return column.filled(0.0)
+
+
+def pareto(items):
+    """
+    Убираем доминируемых: юнит не нужен, если другой не дороже,
+    не больше по размеру и не хуже по цели.
+    """
+    kept = []
+    for item in sorted(items, key=lambda it: (-it[3], it[1], it[2], it[0])):
+        _, cost, size, value = item
+        if not any(c <= cost and s <= size and v >= value for _, c, s, v in kept):
+            kept.append(item)
+    return kept
+
+
+class SquadOptimizer:
+    """
+    Лучший отряд для одной цели по одному снимку данных.
+    items — (индекс юнита, цена, клеток, ценность); юниты без цены
+    или без вклада в цель не рассматриваются. При saturating ценность
+    отряда не больше числа его клеток: min(клеток, сумма вкладов).
+    """
+
+    def __init__(self, units, costs, sizes, values, saturating=False):
+        items = [
+            (i, int(cost), int(size), float(value))
+            for i, (cost, size, value) in enumerate(zip(costs, sizes, values))
+            if cost > 0 and value > 0
+        ]
+        self.units = units
+        self.saturating = saturating
+        self.items = pareto(items)
+        # Дороже самого дорогого из оставшихся юнитов на клетку золото не нужно
+        self.max_cost = [0] * (len(self.items) + 1)
+        for k in range(len(self.items) - 1, -1, -1):
+            self.max_cost[k] = max(self.max_cost[k + 1], self.items[k][1])
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_snapshot(cls, snap, objective, is_large=lambda name: False):
+        costs = np.nan_to_num(snap.dataset['Цена'].values, nan=0.0)
+        sizes = [2 if is_large(u.get('name', '')) else 1 for u in snap.units]
+        return cls(snap.units, costs, sizes, objective_values(snap, objective),
+                   saturating=objective in SATURATING)
+
+    def _best(self, k, slots, gold, cap):
+        """
+        Лучшая ценность из юнитов items[k:] при slots клетках и gold золота,
+        но не больше cap. Вклады неотрицательны, поэтому
+        min(cap, gain + min(cap, x)) = min(cap, gain + x) и подзадачи
+        с тем же cap можно брать из памяти.
+        """
+        gold = min(gold, slots * self.max_cost[k])
+        if k == len(self.items) or slots == 0:
+            return 0.0
+        key = (k, slots, gold, cap)
+        value = self._memo.get(key)
+        if value is None:
+            # Не берём юнит k больше — или берём ещё один экземпляр
+            value = self._best(k + 1, slots, gold, cap)
+            _, cost, size, gain = self.items[k]
+            if size <= slots and cost <= gold:
+                value = max(value, min(cap, gain + self._best(k, slots - size, gold - cost, cap)))
+            self._memo[key] = value
+        return value
+
+    def solve(self, budget, slots=DEFAULT_SLOTS):
+        """Лучший отряд: (ценность, [индексы юнитов]) — при равной ценности дешевле"""
+        budget, slots = int(budget), int(slots)
+        cap = float(slots) if self.saturating else float('inf')
+        with self._lock:
+            best = self._best(0, slots, budget, cap)
+            # Самый дешёвый бюджет с той же ценностью (важно для целей
+            # с пределом: там много отрядов с одинаковой ценностью)
+            low, high = 0, min(budget, slots * self.max_cost[0])
+            while low < high:
+                mid = (low + high) // 2
+                if self._best(0, slots, mid, cap) >= best - 1e-9:
+                    high = mid
+                else:
+                    low = mid + 1
+            budget = high
+            picked, k = [], 0
+            while k < len(self.items) and slots > 0:
+                _, cost, size, gain = self.items[k]
+                gold = min(budget, slots * self.max_cost[k])
+                skip = self._best(k + 1, slots, gold, cap)
+                if (size <= slots and cost <= gold
+                        and min(cap, gain + self._best(k, slots - size, gold - cost, cap)) > skip + 1e-9):
+                    picked.append(self.items[k][0])
+                    slots -= size
+                    budget -= cost
+                else:
+                    k += 1
+        return best, picked
+
+    def __len__(self):
+        return len(self._memo)
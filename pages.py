@@ -0,0 +1,132 @@
+"""
+Кэш готовых страниц: HTML рендерится один раз на версию данных,
+сжатые варианты (gzip/brotli) считаются сразу же. Уровни сжатия
+умеренные: страница собирается на первом запросе после смены данных,
+а brotli 11 на таблице в несколько мегабайт — это десятки секунд.
+"""
+
+import gzip
+import hashlib
+import threading
+
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём только gzip
+    brotli = None
+
+HTML = 'text/html; charset=utf-8'
+JSON = 'application/json; charset=utf-8'
+
+
+# Для кэша в памяти; export.py сжимает бандл один раз и может позволить максимум
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def compress(body, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    """Сжатые варианты тела ответа: {'gzip': bytes, 'br': bytes}"""
+    encoded = {'gzip': gzip.compress(body, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=brotli_quality)
+    return encoded
+
+
+class Page:
+    """Готовый ответ: тело, его сжатые варианты и сильные ETag для каждого"""
+
+    def __init__(self, body, content_type=HTML):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.content_type = content_type
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded = compress(body)
+
+    def pick_encoding(self):
+        """Выбираем лучшее сжатие из тех, что принимает клиент"""
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and accepted[encoding]:
+                return encoding
+        return None
+
+    def response(self, cache_control='no-cache'):
+        encoding = self.pick_encoding()
+        # У каждого варианта кодирования свой сильный ETag
+        etag = f"{self.etag}-{encoding}" if encoding else self.etag
+
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            body = self.encoded[encoding] if encoding else self.body
+            resp = Response(body, content_type=self.content_type)
+            if encoding:
+                resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(etag)
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.headers['Cache-Control'] = cache_control
+        return resp
+
+
+class PageCache:
+    """
+    Страницы по имени; запись устаревает при смене версии данных.
+    Страницу рендерит один запрос: остальные, пришедшие за той же
+    страницей, ждут его на блокировке имени и получают готовую.
+    """
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._filling = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._filling.setdefault(name, threading.Lock())
+
+    def get(self, name, version, render, content_type=HTML):
+        page, rendered = self._fill(name, version, render, content_type)
+        if rendered:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return page
+
+    def fill_later(self, name, version, render, content_type=HTML):
+        """Отрендерить и сжать страницу в фоновом потоке, если её ещё нет в кэше"""
+        if self.peek(name, version) is None:
+            threading.Thread(target=self._fill, args=(name, version, render, content_type),
+                             daemon=True).start()
+
+    def _fill(self, name, version, render, content_type):
+        """(страница, True если её рендерили мы)"""
+        page = self.peek(name, version)
+        if page is not None:
+            return page, False
+        with self._name_lock(name):
+            # Пока ждали, страницу мог отрендерить другой запрос
+            page = self.peek(name, version)
+            if page is not None:
+                return page, False
+            return self.put(name, version, render(), content_type), True
+
+    def peek(self, name, version):
+        """Страница из кэша или None (без подсчёта попаданий)"""
+        entry = self._pages.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def put(self, name, version, body, content_type=HTML):
+        page = Page(body, content_type)
+        with self._lock:
+            self._pages[name] = (version, page)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -4,18 +4,33 @@
 Собирает данные о 29 существах, переводит на русский и сохраняет в CSV
 """
 
+import argparse
 import csv
+import hashlib
+import json
+import os
 import time
 import re
 from urllib.parse import urljoin
-import requests
+import lxml.html
 from bs4 import BeautifulSoup
+from lxml import etree
 
-BASE_URL = "https://disciples.fandom.com"
+from fetcher import DEFAULT_CACHE_DIR, DEFAULT_RATE, DEFAULT_WORKERS, Fetcher, HttpCache
+from wikiapi import PARSE_BATCH, WikiApi, batched
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-}
+# WIKI_URL=http://127.0.0.1:8000 — другой адрес вики (например, локальная копия для проверки)
+BASE_URL = os.environ.get("WIKI_URL", "https://disciples.fandom.com").rstrip("/")
+API_URL = os.environ.get("WIKI_API", f"{BASE_URL}/api.php")
+FACTION = "Империя"
+
+# UNITS_DB=units.db — сохранять в SQLite (upsert по url) вместо CSV
+UNITS_DB = os.environ.get("UNITS_DB")
+CSV_FILE = "empire_units.csv"
+
+# Ревизии страниц с прошлого запуска: в режиме --incremental разбираем только изменённые
+STATE_FILE = os.environ.get("SCRAPE_STATE", "scrape_state.json")
+REVISION_RE = re.compile(r'"wgRevisionId":\s*(\d+)')
 
 # Список юнитов Империи (29 штук) - английские названия и URL (формат /D2)
 EMPIRE_UNITS = [
@@ -157,13 +172,6 @@ TRANSLATIONS = {
 }
 
 
-def get_soup(url: str) -> BeautifulSoup:
-    """Получить BeautifulSoup объект для URL"""
-    response = requests.get(url, headers=HEADERS, timeout=30)
-    response.raise_for_status()
-    return BeautifulSoup(response.text, "lxml")
-
-
 def translate(text: str) -> str:
     """Перевести текст на русский"""
     if not text:
@@ -192,9 +200,118 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def parse_unit_page(url: str, en_name: str) -> dict:
-    """Парсить страницу юнита и извлечь характеристики"""
-    soup = get_soup(url)
+# Поля инфобокса: английская подпись -> русская колонка
+INFOBOX_FIELDS = {
+    # Основные
+    "Level": "Уровень",
+    "Size": "Размер",
+    "Hit Points": "Здоровье",
+    "Hit points": "Здоровье",
+    "HP": "Здоровье",
+    "Armor": "Броня",
+
+    # Атака
+    "Attack": "Атака",
+    "Attack name": "Атака",
+    "Damage": "Урон",
+    "Initiative": "Инициатива",
+    "Source": "Источник",
+    "Class": "Класс атаки",
+    "Chances to hit": "Шанс попадания",
+
+    # Защита
+    "Ward": "Защита",
+    "Wards": "Защита",
+    "Immunity": "Иммунитет",
+    "Immunities": "Иммунитет",
+
+    # Цели
+    "Reach": "Дальность",
+    "Target": "Цель",
+    "Targets": "Кол-во целей",
+
+    # Опыт и стоимость
+    "Cost": "Цена",
+    "Gold cost": "Цена",
+    "XP": "Опыт",
+    "Experience": "Опыт",
+    "XP next": "Опыт до апгрейда",
+    "XP Killed": "Опыт за убийство",
+    "XP killed": "Опыт за убийство",
+
+    # Прочее
+    "Leadership": "Лидерство",
+    "Movement": "Перемещение",
+    "Scouting Range": "Обзор",
+    "Scouting range": "Обзор",
+    "Regeneration": "Регенерация",
+    "Accuracy": "Точность",
+    "Healing": "Лечение",
+    "Effect": "Эффект",
+}
+
+# Поля таблиц article-table: берутся, только если их не было в инфобоксе
+TABLE_FIELDS = {
+    "Level": "Уровень",
+    "Hit Points": "Здоровье",
+    "Armor": "Броня",
+    "Damage": "Урон",
+    "Source": "Источник",
+    "Initiative": "Инициатива",
+    "Reach": "Цель",
+    "XP Killed": "Опыт за убийство",
+}
+
+# Движок разбора: "lxml" — только нужные поддеревья через XPath, "soup" — BeautifulSoup
+PARSE_ENGINE = os.environ.get("PARSE_ENGINE", "lxml")
+
+
+def is_unit_image(src: str) -> bool:
+    """Картинка юнита лежит на static.wikia.nocookie.net и это gif/png"""
+    if not src or "static.wikia.nocookie.net" not in src:
+        return False
+    return ".gif" in src.lower() or ".png" in src.lower()
+
+
+def clean_image_url(image_url: str) -> str:
+    """Убрать из адреса картинки уменьшение до заданной ширины"""
+    if image_url:
+        image_url = re.sub(r'/scale-to-width-down/\d+', '', image_url)
+        image_url = re.sub(r'/scale-to-width/\d+', '', image_url)
+    return image_url
+
+
+def add_infobox_field(data: dict, label: str, value: str):
+    key = clean_text(label)
+    val = clean_text(value)
+    # Пропускаем мусор
+    if len(val) > 150 or "•" in val:
+        return
+    if key in INFOBOX_FIELDS:
+        # Переводим значение если нужно
+        data[INFOBOX_FIELDS[key]] = translate(val)
+
+
+def add_table_field(data: dict, label: str, value: str):
+    key = clean_text(label)
+    val = clean_text(value)
+    if key and val and len(val) < 100:
+        # Пробуем добавить если ещё нет
+        if key in TABLE_FIELDS and TABLE_FIELDS[key] not in data:
+            data[TABLE_FIELDS[key]] = translate(val)
+
+
+def parse_unit_html(html: str, url: str, en_name: str, engine: str = None) -> dict:
+    """Извлечь характеристики юнита из HTML страницы"""
+    engine = engine or PARSE_ENGINE
+    if engine not in PARSE_ENGINES:
+        raise ValueError(f"Неизвестный движок разбора: {engine}")
+    return PARSE_ENGINES[engine](html, url, en_name)
+
+
+def parse_unit_soup(html: str, url: str, en_name: str) -> dict:
+    """Разбор через полное дерево BeautifulSoup"""
+    soup = BeautifulSoup(html, "lxml")
     data = {
         "url": url,
         "name_en": en_name,
@@ -209,10 +326,9 @@ def parse_unit_page(url: str, en_name: str) -> dict:
         # Ищем все img теги в инфобоксе
         for img in infobox.find_all("img"):
             src = img.get("data-src") or img.get("src") or ""
-            if src and "static.wikia.nocookie.net" in src:
-                if ".gif" in src.lower() or ".png" in src.lower():
-                    image_url = src
-                    break
+            if is_unit_image(src):
+                image_url = src
+                break
     
     # Метод 2: Первое изображение в контенте
     if not image_url:
@@ -220,119 +336,107 @@ def parse_unit_page(url: str, en_name: str) -> dict:
         if content:
             for img in content.find_all("img"):
                 src = img.get("data-src") or img.get("src") or ""
-                if src and "static.wikia.nocookie.net" in src:
-                    if ".gif" in src.lower() or ".png" in src.lower():
-                        image_url = src
-                        break
-    
-    # Очищаем URL изображения
-    if image_url:
-        image_url = re.sub(r'/scale-to-width-down/\d+', '', image_url)
-        image_url = re.sub(r'/scale-to-width/\d+', '', image_url)
+                if is_unit_image(src):
+                    image_url = src
+                    break
     
-    data["image_url"] = image_url
+    data["image_url"] = clean_image_url(image_url)
     
     # Парсим инфобокс для характеристик
     if infobox:
-        items = infobox.find_all("div", class_="pi-item")
-        for item in items:
+        for item in infobox.find_all("div", class_="pi-item"):
             label = item.find("h3", class_="pi-data-label")
             value = item.find("div", class_="pi-data-value")
-            
             if label and value:
-                key = clean_text(label.get_text())
-                val = clean_text(value.get_text())
-                
-                # Пропускаем мусор
-                if len(val) > 150 or "•" in val:
-                    continue
-                
-                # Маппинг английских полей на русские
-                field_map = {
-                    # Основные
-                    "Level": "Уровень",
-                    "Size": "Размер",
-                    "Hit Points": "Здоровье",
-                    "Hit points": "Здоровье",
-                    "HP": "Здоровье",
-                    "Armor": "Броня",
-                    
-                    # Атака
-                    "Attack": "Атака",
-                    "Attack name": "Атака",
-                    "Damage": "Урон",
-                    "Initiative": "Инициатива",
-                    "Source": "Источник",
-                    "Class": "Класс атаки",
-                    "Chances to hit": "Шанс попадания",
-                    
-                    # Защита
-                    "Ward": "Защита",
-                    "Wards": "Защита",
-                    "Immunity": "Иммунитет",
-                    "Immunities": "Иммунитет",
-                    
-                    # Цели
-                    "Reach": "Дальность",
-                    "Target": "Цель",
-                    "Targets": "Кол-во целей",
-                    
-                    # Опыт и стоимость
-                    "Cost": "Цена",
-                    "Gold cost": "Цена",
-                    "XP": "Опыт",
-                    "Experience": "Опыт",
-                    "XP next": "Опыт до апгрейда",
-                    "XP Killed": "Опыт за убийство",
-                    "XP killed": "Опыт за убийство",
-                    
-                    # Прочее
-                    "Leadership": "Лидерство",
-                    "Movement": "Перемещение",
-                    "Scouting Range": "Обзор",
-                    "Scouting range": "Обзор",
-                    "Regeneration": "Регенерация",
-                    "Accuracy": "Точность",
-                    "Healing": "Лечение",
-                    "Effect": "Эффект",
-                }
-                
-                if key in field_map:
-                    ru_key = field_map[key]
-                    # Переводим значение если нужно
-                    ru_val = translate(val)
-                    data[ru_key] = ru_val
+                add_infobox_field(data, label.get_text(), value.get_text())
     
     # Парсим таблицы с характеристиками (если есть)
     content = soup.find("div", class_="mw-parser-output")
     if content:
-        tables = content.find_all("table", class_="article-table")
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
+        for table in content.find_all("table", class_="article-table"):
+            for row in table.find_all("tr"):
                 cells = row.find_all(["th", "td"])
                 if len(cells) >= 2:
-                    key = clean_text(cells[0].get_text())
-                    val = clean_text(cells[1].get_text())
-                    
-                    if key and val and len(val) < 100:
-                        # Пробуем добавить если ещё нет
-                        field_map = {
-                            "Level": "Уровень",
-                            "Hit Points": "Здоровье",
-                            "Armor": "Броня",
-                            "Damage": "Урон",
-                            "Source": "Источник",
-                            "Initiative": "Инициатива",
-                            "Reach": "Цель",
-                            "XP Killed": "Опыт за убийство",
-                        }
-                        if key in field_map and field_map[key] not in data:
-                            data[field_map[key]] = translate(val)
+                    add_table_field(data, cells[0].get_text(), cells[1].get_text())
     
     return data
 
 
+def _has_class(name: str) -> str:
+    """Условие XPath «у элемента есть класс name» (как class_= в BeautifulSoup)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPath компилируются один раз; дерево строит libxml2 без объектов Python
+# на каждый узел, и обходим мы только инфобокс, картинки и article-table
+_XP_INFOBOX = etree.XPath(f"(//aside[{_has_class('portable-infobox')}])[1]")
+_XP_CONTENT = etree.XPath(f"(//div[{_has_class('mw-parser-output')}])[1]")
+_XP_IMAGES = etree.XPath(".//img")
+_XP_INFOBOX_ITEMS = etree.XPath(
+    f".//div[{_has_class('pi-item')}]"
+    f"[.//h3[{_has_class('pi-data-label')}] and .//div[{_has_class('pi-data-value')}]]"
+)
+_XP_LABEL = etree.XPath(f"(.//h3[{_has_class('pi-data-label')}])[1]")
+_XP_VALUE = etree.XPath(f"(.//div[{_has_class('pi-data-value')}])[1]")
+_XP_TABLE_ROWS = etree.XPath(f".//table[{_has_class('article-table')}]//tr")
+_XP_CELLS = etree.XPath(".//th | .//td")
+_XP_TEXT = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+
+
+def _text(element) -> str:
+    """Текст элемента без комментариев, скриптов и стилей (как get_text() в BeautifulSoup)"""
+    return "".join(_XP_TEXT(element))
+
+
+def _first(xpath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def _image(element) -> str:
+    """Первая картинка юнита внутри element"""
+    for img in _XP_IMAGES(element):
+        src = img.get("data-src") or img.get("src") or ""
+        if is_unit_image(src):
+            return src
+    return ""
+
+
+def parse_unit_lxml(html: str, url: str, en_name: str) -> dict:
+    """Разбор через lxml: результат тот же, что у parse_unit_soup"""
+    root = lxml.html.document_fromstring(html)
+    data = {
+        "url": url,
+        "name_en": en_name,
+        "name": translate(en_name)
+    }
+    infobox = _first(_XP_INFOBOX, root)
+    content = _first(_XP_CONTENT, root)
+
+    image_url = _image(infobox) if infobox is not None else ""
+    if not image_url and content is not None:
+        image_url = _image(content)
+    data["image_url"] = clean_image_url(image_url)
+
+    if infobox is not None:
+        for item in _XP_INFOBOX_ITEMS(infobox):
+            add_infobox_field(data, _text(_XP_LABEL(item)[0]), _text(_XP_VALUE(item)[0]))
+
+    if content is not None:
+        for row in _XP_TABLE_ROWS(content):
+            cells = _XP_CELLS(row)
+            if len(cells) >= 2:
+                add_table_field(data, _text(cells[0]), _text(cells[1]))
+
+    return data
+
+
+PARSE_ENGINES = {
+    "lxml": parse_unit_lxml,
+    "soup": parse_unit_soup,
+}
+
+
 def get_unit_links() -> list[dict]:
     """Получить список ссылок на страницы юнитов"""
     units = []
@@ -341,7 +445,8 @@ def get_unit_links() -> list[dict]:
         url = f"{BASE_URL}/wiki/{slug}"
         units.append({
             "name": name,
-            "url": url
+            "url": url,
+            "title": slug.replace("_", " "),
         })
     
     return units
@@ -386,7 +491,7 @@ def normalize_data(units_data: list[dict]) -> tuple[list[str], list[dict]]:
     return sorted_keys, normalized
 
 
-def save_to_csv(units_data: list[dict], filename: str = "empire_units.csv"):
+def save_to_csv(units_data: list[dict], filename: str = CSV_FILE):
     """Сохранить данные в CSV файл"""
     if not units_data:
         print("Нет данных для сохранения!")
@@ -403,7 +508,229 @@ def save_to_csv(units_data: list[dict], filename: str = "empire_units.csv"):
     print(f"Колонок: {len(keys)}")
 
 
+def load_csv(filename: str = CSV_FILE) -> tuple[list[str], list[dict]]:
+    """Уже собранные данные: (колонки, строки); нет файла — пусто"""
+    if not os.path.exists(filename):
+        return [], []
+    with open(filename, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return list(reader.fieldnames or []), list(reader)
+
+
+def unit_keys(unit: dict) -> list[str]:
+    """Ключи для сопоставления строк: url и английское имя"""
+    keys = []
+    if unit.get("url"):
+        keys.append("url:" + unit["url"])
+    if unit.get("name_en"):
+        keys.append("en:" + unit["name_en"])
+    return keys
+
+
+def merge_units(columns: list[str], rows: list[dict],
+                updates: list[dict]) -> tuple[list[str], list[dict]]:
+    """
+    Влить обновлённые строки в существующие (по url или name_en),
+    новые — добавить в конец. Обновлённая строка целиком заменяется
+    свежим разбором: поле, которое исчезло со страницы, становится пустым.
+    Колонки дополняются только ключами обновлённых строк (по правилам
+    normalize_data), остальные строки не пересматриваются.
+    """
+    new_columns, _ = normalize_data(updates)
+    columns = list(columns) + [key for key in new_columns if key not in columns]
+    index = {}
+    for i, row in enumerate(rows):
+        for key in unit_keys(row):
+            index.setdefault(key, i)
+
+    rows = list(rows)
+    for unit in updates:
+        pos = next((index[k] for k in unit_keys(unit) if k in index), None)
+        if pos is None:
+            pos = len(rows)
+            rows.append({})
+            for key in unit_keys(unit):
+                index.setdefault(key, pos)
+        rows[pos] = unit
+
+    return columns, [{key: row.get(key, "") for key in columns} for row in rows]
+
+
+def save_merged_csv(units_data: list[dict], filename: str = CSV_FILE):
+    """Обновить в CSV только изменившиеся строки (файл переписывается, если есть что менять)"""
+    if not units_data:
+        print("Изменений нет — CSV не тронут")
+        return
+    columns, rows = load_csv(filename)
+    if not columns:
+        save_to_csv(units_data, filename)
+        return
+    columns, rows = merge_units(columns, rows, units_data)
+    tmp = filename + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, filename)
+    print(f"Данные обновлены в {filename}: изменено юнитов {len(units_data)}, всего {len(rows)}")
+
+
+def save_to_db(units_data: list[dict], db_path: str, faction: str = FACTION):
+    """Обновить юнитов в базе SQLite построчно (остальные строки не трогаются)"""
+    import db
+
+    if not units_data:
+        print("Нет данных для сохранения!")
+        return
+
+    keys, normalized = normalize_data(units_data)
+    conn = db.connect(db_path)
+    try:
+        count = db.upsert_units(conn, normalized, faction, keys)
+    finally:
+        conn.close()
+
+    print(f"Данные сохранены в {db_path}")
+    print(f"Обновлено юнитов: {count}")
+
+
+def page_revision(html: str) -> str:
+    """Номер ревизии страницы MediaWiki, а если его нет — хэш HTML"""
+    m = REVISION_RE.search(html)
+    if m:
+        return f"rev:{m.group(1)}"
+    return "sha256:" + hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def load_state(path: str = STATE_FILE) -> dict:
+    """{url: ревизия} с прошлого запуска"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict, path: str = STATE_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def scrape_units(units: list[dict], fetcher: Fetcher, state: dict = None,
+                 known: set = frozenset(), engine: str = None) -> list[dict]:
+    """
+    Скачать и разобрать страницы юнитов в пуле потоков.
+    Порядок результата — как в units, независимо от порядка загрузки.
+    С state ({url: ревизия}) страницы, чья ревизия не изменилась и чей
+    юнит уже есть в данных (known — их url), не разбираются и в результат
+    не попадают; state обновляется.
+    """
+    results = [None] * len(units)
+    done = skipped = 0
+
+    def parse(unit):
+        url = unit["url"]
+        html = fetcher.text(url)
+        revision = page_revision(html)
+        if state is not None and state.get(url) == revision and url in known:
+            return revision, None
+        return revision, parse_unit_html(html, url, unit["name"], engine)
+
+    for i, unit, result, error in fetcher.map(parse, units):
+        done += 1
+        if error is not None:
+            print(f"  [{done}/{len(units)}] {unit['name']}: Ошибка: {error}")
+            continue
+        revision, data = result
+        if state is not None:
+            state[unit["url"]] = revision
+        if data is None:
+            skipped += 1
+            continue
+        results[i] = data
+        print_unit(done, len(units), data)
+    if skipped:
+        print(f"  без изменений: {skipped}")
+    return [data for data in results if data is not None]
+
+
+def print_unit(done: int, total: int, data: dict):
+    img_status = "✓" if data.get("image_url") else "✗"
+    hp = data.get("Здоровье", "?")
+    dmg = data.get("Урон", "?")
+    print(f"  [{done}/{total}] {data['name']} | HP:{hp} DMG:{dmg} IMG:{img_status}")
+
+
+def scrape_units_api(units: list[dict], fetcher: Fetcher, state: dict = None,
+                     known: set = frozenset(), engine: str = None,
+                     batch: int = PARSE_BATCH) -> list[dict]:
+    """
+    То же, что scrape_units, но через api.php: ревизии всех страниц —
+    одним-двумя запросами, HTML — по batch страниц за запрос.
+    Неизменившиеся страницы (по ревизии) не запрашиваются вовсе.
+    """
+    api = WikiApi(API_URL, fetcher)
+    revisions = api.revisions([unit["title"] for unit in units])
+
+    pending = []
+    skipped = 0
+    for i, unit in enumerate(units):
+        if unit["title"] not in revisions:
+            print(f"  {unit['name']}: Ошибка: страницы {unit['title']} нет в вики")
+            continue
+        revision = f"rev:{revisions[unit['title']]}"
+        if state is not None and state.get(unit["url"]) == revision and unit["url"] in known:
+            skipped += 1
+            continue
+        pending.append((i, unit, revision))
+
+    results = [None] * len(units)
+    done = 0
+
+    def parse(chunk):
+        return api.parse_many([unit["title"] for _, unit, _ in chunk])
+
+    for _, chunk, pages, error in fetcher.map(parse, batched(pending, batch)):
+        for i, unit, revision in chunk:
+            done += 1
+            html = pages.get(unit["title"]) if error is None else None
+            if html is None:
+                print(f"  [{done}/{len(pending)}] {unit['name']}: Ошибка: {error or 'нет в ответе api.php'}")
+                continue
+            data = parse_unit_html(html, unit["url"], unit["name"], engine)
+            if state is not None:
+                state[unit["url"]] = revision
+            results[i] = data
+            print_unit(done, len(pending), data)
+    if skipped:
+        print(f"  без изменений: {skipped}")
+    return [data for data in results if data is not None]
+
+
 def main():
+    ap = argparse.ArgumentParser(description="Парсер юнитов Империи из Disciples II Wiki")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="одновременных загрузок")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                    help="запросов в секунду к одному хосту (0 — без ограничения)")
+    ap.add_argument("--cache", default=os.environ.get("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR),
+                    help="папка кэша страниц (условные запросы по ETag/Last-Modified)")
+    ap.add_argument("--no-cache", action="store_true", help="не использовать кэш страниц")
+    ap.add_argument("--offline", action="store_true", help="только из кэша, без сети")
+    ap.add_argument("--incremental", action="store_true",
+                    help="разбирать только изменённые страницы и вливать их в готовые данные")
+    ap.add_argument("--engine", choices=sorted(PARSE_ENGINES), default=PARSE_ENGINE,
+                    help="чем разбирать HTML (по умолчанию lxml)")
+    ap.add_argument("--source", choices=("html", "api"), default="html",
+                    help="html — по странице на запрос, api — пачками через api.php")
+    ap.add_argument("--batch", type=int, default=PARSE_BATCH,
+                    help="страниц на один запрос action=parse (для --source api)")
+    args = ap.parse_args()
+    if args.offline and args.no_cache:
+        ap.error("--offline работает только с кэшем")
+    cache = None if args.no_cache else HttpCache(args.cache)
+
     print("=" * 60)
     print("Парсер юнитов Империи - Disciples II (English Wiki)")
     print("=" * 60)
@@ -413,28 +740,40 @@ def main():
     units = get_unit_links()
     print(f"Всего юнитов: {len(units)}")
     
-    # Парсим каждого юнита
-    print("\n[2/3] Парсим страницы юнитов...")
-    units_data = []
-    
-    for i, unit in enumerate(units, 1):
-        print(f"  [{i}/{len(units)}] {unit['name']}...")
-        try:
-            data = parse_unit_page(unit["url"], unit["name"])
-            units_data.append(data)
-            
-            img_status = "✓" if data.get("image_url") else "✗"
-            hp = data.get("Здоровье", "?")
-            dmg = data.get("Урон", "?")
-            print(f"    → {data['name']} | HP:{hp} DMG:{dmg} IMG:{img_status}")
-            
-            time.sleep(0.3)
-        except Exception as e:
-            print(f"    Ошибка: {e}")
+    # Парсим страницы параллельно
+    print(f"\n[2/3] Парсим страницы юнитов ({args.workers} потоков, до {args.rate:g} запр/с)...")
+    started = time.perf_counter()
+    state, known = None, set()
+    if args.incremental:
+        state = load_state()
+        if UNITS_DB:
+            import db
+            _, existing = db.load_units(UNITS_DB, FACTION)
+        else:
+            _, existing = load_csv()
+        known = {unit.get("url") for unit in existing}
+    with Fetcher(args.workers, args.rate, cache=cache, offline=args.offline) as fetcher:
+        if args.source == "api":
+            units_data = scrape_units_api(units, fetcher, state, known, args.engine, args.batch)
+        else:
+            units_data = scrape_units(units, fetcher, state, known, args.engine)
+    print(f"  {fetcher.requests} запросов за {time.perf_counter() - started:.1f} с")
+    if cache is not None:
+        print(f"  кэш: не изменилось {fetcher.not_modified}, без сети {fetcher.offline_hits}, "
+              f"скачано {fetcher.downloads}")
     
     # Сохраняем в CSV
     print("\n[3/3] Сохраняем данные...")
-    save_to_csv(units_data)
+    if UNITS_DB:
+        # База и так обновляется построчно
+        if units_data or not args.incremental:
+            save_to_db(units_data, UNITS_DB)
+    elif args.incremental:
+        save_merged_csv(units_data)
+    else:
+        save_to_csv(units_data)
+    if state is not None:
+        save_state(state)
     
     print("\n" + "=" * 60)
     print(f"Готово! Обработано юнитов: {len(units_data)}")
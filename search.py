@@ -0,0 +1,132 @@
+"""
+Полнотекстовый поиск по юнитам.
+Индекс строится вместе со снимком данных: обратный индекс по словам,
+отсортированный словарь для поиска по префиксу и триграммы для опечаток.
+Все слова приводятся к латинице, поэтому «angel» находит «Ангел».
+"""
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+# Поля для поиска и их вес в ранжировании
+SEARCH_FIELDS = {
+    'name': 3.0,
+    'name_en': 3.0,
+    'Атака': 1.5,
+    'Источник': 1.0,
+    'Защита': 1.0,
+    'Иммунитет': 1.0,
+}
+
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+TRANSLIT_TABLE = str.maketrans(TRANSLIT)
+
+WORD_RE = re.compile(r'\w+')
+
+# Очки за совпадение слова целиком, по префиксу и по триграммам
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.0
+MIN_SIMILARITY = 0.35
+
+
+def normalize(text):
+    """Нижний регистр и латиница: 'Ангел' → 'angel'"""
+    return text.lower().translate(TRANSLIT_TABLE)
+
+
+def tokenize(text):
+    return WORD_RE.findall(normalize(text or ''))
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Обратный индекс по снимку данных; сам индекс после сборки не меняется"""
+
+    def __init__(self, units):
+        postings = defaultdict(dict)
+        for doc, unit in enumerate(units):
+            for field, weight in SEARCH_FIELDS.items():
+                for token in tokenize(unit.get(field, '')):
+                    # Для каждого слова храним лучший вес поля, где оно встретилось
+                    postings[token][doc] = max(postings[token].get(doc, 0.0), weight)
+
+        self.size = len(units)
+        self.postings = dict(postings)
+        self.tokens = sorted(self.postings)
+        self.token_trigrams = {t: trigrams(t) for t in self.tokens}
+        grams = defaultdict(set)
+        for token, token_grams in self.token_trigrams.items():
+            for g in token_grams:
+                grams[g].add(token)
+        self.grams = dict(grams)
+        self.search = lru_cache(maxsize=1024)(self._search)
+
+    def prefixed(self, prefix):
+        """Слова словаря, начинающиеся с prefix (бинарный поиск)"""
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            yield self.tokens[i]
+            i += 1
+
+    def similar(self, term):
+        """Слова, похожие на term по триграммам (коэффициент Жаккара)"""
+        term_grams = trigrams(term)
+        counts = defaultdict(int)
+        for g in term_grams:
+            for token in self.grams.get(g, ()):
+                counts[token] += 1
+        for token, shared in counts.items():
+            similarity = shared / len(term_grams | self.token_trigrams[token])
+            if similarity >= MIN_SIMILARITY:
+                yield token, similarity
+
+    def match_term(self, term):
+        """Оценки документов по одному слову запроса: {doc: score}"""
+        scores = {}
+
+        def add(token, score):
+            for doc, weight in self.postings[token].items():
+                scores[doc] = max(scores.get(doc, 0.0), score * weight)
+
+        if term in self.postings:
+            add(term, EXACT_SCORE)
+        for token in self.prefixed(term):
+            if token != term:
+                add(token, PREFIX_SCORE)
+        if not scores:
+            # Ни точных совпадений, ни префиксов — ищем с опечаткой
+            for token, similarity in self.similar(term):
+                add(token, FUZZY_SCORE * similarity)
+        return scores
+
+    def _search(self, query):
+        """
+        Индексы подходящих юнитов с оценкой, лучшие первыми.
+        Каждое слово запроса должно совпасть хотя бы с одним полем.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return ()
+        total = None
+        for term in terms:
+            scores = self.match_term(term)
+            if total is None:
+                total = scores
+            else:
+                total = {doc: total[doc] + s for doc, s in scores.items() if doc in total}
+            if not total:
+                return ()
+        return tuple(sorted(total.items(), key=lambda item: (-item[1], item[0])))
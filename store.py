@@ -0,0 +1,158 @@
+"""
+Хранилище юнитов в памяти процесса
+Данные загружаются один раз и перечитываются только при изменении файла
+"""
+
+import os
+import re
+import signal
+import threading
+import time
+
+from dataset import UnitDataset
+from metrics import METRICS, MetricTable
+from search import SearchIndex
+
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+EMPTY_VALUES = ('', '—')
+
+
+def sort_key(value):
+    """Ключ сортировки: числа по значению, затем строки; пустые — None"""
+    value = (value or '').strip()
+    if value in EMPTY_VALUES:
+        return None
+    m = NUMBER_RE.match(value)
+    if m:
+        return (0, float(m.group()), value)
+    return (1, 0.0, value.lower())
+
+
+class Snapshot:
+    """Неизменяемый снимок данных, который видят обработчики запросов"""
+
+    __slots__ = ('version', 'columns', 'units', 'by_name', 'dataset', 'metrics',
+                 'search_index', 'loaded_at', '_orders')
+
+    def __init__(self, version, columns, units, metrics=METRICS):
+        self.version = version
+        self.columns = tuple(columns)
+        self.units = tuple(units)
+        self.by_name = {u['name']: u for u in self.units if u.get('name')}
+        self.dataset = UnitDataset.from_units(self.units)
+        # Производные показатели считаются один раз на версию и сортируются как обычные колонки
+        self.metrics = MetricTable.compute(self.dataset, metrics)
+        for column in self.metrics.columns.values():
+            self.dataset.add(column)
+        self.search_index = SearchIndex(self.units)
+        self.loaded_at = time.time()
+        self._orders = {}
+
+    def __bool__(self):
+        return bool(self.units)
+
+    def order(self, column, descending=False):
+        """
+        Индексы юнитов, отсортированные по колонке (пустые значения в конце).
+        Порядок считается один раз на колонку и живёт вместе со снимком.
+        """
+        orders = self._orders.get(column)
+        if orders is None:
+            if column in self.dataset:
+                # Типизированные колонки сортируются векторно
+                orders = (tuple(self.dataset.argsort(column).tolist()),
+                          tuple(self.dataset.argsort(column, descending=True).tolist()))
+            else:
+                keyed = [(sort_key(u.get(column)), i) for i, u in enumerate(self.units)]
+                present = sorted((k, i) for k, i in keyed if k is not None)
+                asc = [i for _, i in present]
+                empty = [i for k, i in keyed if k is None]
+                orders = (tuple(asc + empty), tuple(asc[::-1] + empty))
+            self._orders[column] = orders
+        return orders[1] if descending else orders[0]
+
+
+class UnitStore:
+    """
+    Общий для всех потоков снимок данных.
+    Файл перечитывается, только если у него изменились mtime или размер
+    (проверка не чаще раза в check_interval секунд), либо по сигналу.
+    Новый снимок подменяется целиком, поэтому читатели никогда не видят
+    наполовину загруженные данные.
+    """
+
+    def __init__(self, loader, path, check_interval=1.0, watch=(), metrics=METRICS):
+        self.loader = loader
+        self.metrics = tuple(metrics)
+        self.path = path
+        # Кроме основного файла можно следить за соседними (например, -wal у SQLite)
+        # и за чем угодно ещё: функция в watch возвращает ключ состояния
+        self.paths = (path,) + tuple(watch)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot(0, [], [], self.metrics)
+        self._stat_key = None
+        self._checked_at = 0.0
+        self._reload_requested = False
+        # Для мониторинга: сколько раз и как долго перечитывали данные
+        self.reloads = 0
+        self.reload_seconds = 0.0
+        self.reload(force=True)
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def _stat(self):
+        key = []
+        for path in self.paths:
+            if callable(path):
+                key.append(path())
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                key.append(None)
+            else:
+                key.append((st.st_mtime_ns, st.st_size))
+        return tuple(key)
+
+    def current(self):
+        """Текущий снимок без проверки файлов (для мониторинга и служебного кода)"""
+        return self._snapshot
+
+    def get(self):
+        """Текущий снимок; при необходимости перечитываем файл"""
+        now = time.monotonic()
+        if self._reload_requested:
+            self.reload(force=True)
+        elif now - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._snapshot
+
+    def reload(self, force=False):
+        """Перечитать данные, если файл изменился (или всегда при force)"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            key = self._stat()
+            if not force and key == self._stat_key:
+                return self._snapshot
+            self._reload_requested = False
+            started = time.perf_counter()
+            columns, units = self.loader()
+            self._snapshot = Snapshot(self._snapshot.version + 1, columns, units, self.metrics)
+            self._stat_key = key
+            self.reloads += 1
+            self.reload_seconds += time.perf_counter() - started
+            return self._snapshot
+
+    def request_reload(self, *_):
+        """Отметить данные устаревшими: перечитаем их при следующем запросе"""
+        self._reload_requested = True
+
+    def install_signal_handler(self, signum=getattr(signal, 'SIGHUP', None)):
+        """Перечитывать данные по сигналу (по умолчанию SIGHUP)"""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, self.request_reload)
+        return True
@@ -0,0 +1,85 @@
+"""
+Общие фикстуры тестов: локальный HTTP-сервер вместо вики.
+Обработчик задаётся функцией handle(запрос) -> (статус, заголовки, тело);
+все запросы складываются в server.requests.
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIXTURES = os.path.join(ROOT, 'fixtures')
+
+
+class Request:
+    """Что пришло на сервер: путь, параметры, заголовки и время"""
+
+    def __init__(self, handler):
+        parts = urlsplit(handler.path)
+        self.path = parts.path
+        self.params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        self.headers = handler.headers
+        self.host = handler.headers.get('Host', '')
+        self.time = time.monotonic()
+
+
+class LocalServer:
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                request = Request(self)
+                with server._lock:
+                    server.requests.append(request)
+                status, headers, body = server.handle(request)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def local_server():
+    """local_server(handle) — поднять сервер с обработчиком; гасится после теста"""
+    servers = []
+
+    def start(handle):
+        server = LocalServer(handle)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
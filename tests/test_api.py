@@ -0,0 +1,60 @@
+"""Проверка параметров JSON API (app.py) на данных из empire_units.csv"""
+
+import pytest
+
+import battle
+from app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('query', [
+    'a=Рыцарь*200&b=Ангел*200',
+    'a=Рыцарь*100000000&b=Ангел',
+    'a=Рыцарь*0&b=Ангел',
+    'a=Рыцарь*4,Лучник*3&b=Ангел',
+    # Три больших юнита — шесть клеток, седьмой уже не помещается
+    'a=Титан*3,Рыцарь&b=Ангел',
+])
+def test_battle_rejects_oversized_squads(client, query):
+    response = client.get(f"/api/battle?{query}&battles=10")
+    assert response.status_code == 400
+
+
+def test_battle_accepts_full_squad(client):
+    response = client.get("/api/battle?a=Титан*3&b=Рыцарь*6&battles=10")
+    assert response.status_code == 200
+    assert response.get_json()['a'] == ['Титан'] * 3
+
+
+def test_parse_squad_stops_before_expanding():
+    with pytest.raises(ValueError):
+        battle.parse_squad('Рыцарь*' + '9' * 18)
+    assert battle.parse_squad('Рыцарь, Лучник*2') == ['Рыцарь', 'Лучник', 'Лучник']
+
+
+@pytest.mark.parametrize('value, total', [
+    ('Урон:abc', 0),
+    ('Урон:', 8),
+    ('Урон:100', 2),
+    ('Источник:Нечто', 0),
+    ('Источник:Оружие', 14),
+])
+def test_units_filter_matches_only_known_values(client, value, total):
+    response = client.get(f"/api/units?fields=name&filter={value}")
+    assert response.status_code == 200
+    assert response.get_json()['total'] == total
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_search_rejects_limit_below_one(client, limit):
+    assert client.get(f"/api/search?q=ангел&limit={limit}").status_code == 400
+
+
+def test_search_limit_keeps_top_hits(client):
+    hits = client.get("/api/search?q=а&limit=1000").get_json()
+    top = client.get("/api/search?q=а&limit=2").get_json()
+    assert top['units'] == hits['units'][:2]
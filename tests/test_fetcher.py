@@ -0,0 +1,145 @@
+"""Загрузка страниц вики (fetcher.py, parser.scrape_units) на локальном сервере"""
+
+import glob
+import os
+import time
+
+import pytest
+import requests
+
+import parser
+from conftest import FIXTURES
+from fetcher import Fetcher, TokenBucket
+
+
+def test_map_keeps_indexes_when_pages_finish_out_of_order(local_server):
+    # Первые страницы отвечают дольше всех — готовы они будут последними
+    def handle(request):
+        n = int(request.path.rsplit('/', 1)[-1])
+        time.sleep(0.02 * (8 - n))
+        return 200, {}, f"page {n}"
+
+    server = local_server(handle)
+    urls = [f"{server.url}/page/{n}" for n in range(8)]
+    with Fetcher(workers=8, rate=0) as fetcher:
+        results = list(fetcher.map(fetcher.text, urls))
+
+    finished = [i for i, _, _, _ in results]
+    assert finished != sorted(finished)
+    for i, url, text, error in results:
+        assert error is None
+        assert url == urls[i]
+        assert text == f"page {i}"
+
+
+def test_scrape_units_returns_units_in_list_order(local_server, monkeypatch):
+    pages = {}
+    for path in glob.glob(os.path.join(FIXTURES, 'pages', '*.html')):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)[:-len('.html')]] = f.read()
+
+    # Чем раньше юнит в списке, тем дольше отвечает его страница
+    delays = {slug.replace('/', '_'): 0.002 * (len(parser.EMPIRE_UNITS) - i)
+              for i, (_, slug) in enumerate(parser.EMPIRE_UNITS)}
+
+    def handle(request):
+        slug = request.path[len('/wiki/'):].replace('/', '_')
+        time.sleep(delays[slug])
+        return 200, {'Content-Type': 'text/html; charset=utf-8'}, pages[slug]
+
+    server = local_server(handle)
+    monkeypatch.setattr(parser, 'BASE_URL', server.url)
+    units = parser.get_unit_links()
+    with Fetcher(workers=8, rate=0) as fetcher:
+        data = parser.scrape_units(units, fetcher)
+
+    assert [d['name_en'] for d in data] == [name for name, _ in parser.EMPIRE_UNITS]
+    assert [d['url'] for d in data] == [u['url'] for u in units]
+    angel = data[0]
+    assert angel['Здоровье'] == '225'
+    assert angel['image_url'].endswith('/Angel.png/revision/latest')
+
+
+def test_rate_limit_is_per_host(local_server):
+    server = local_server(lambda request: (200, {}, 'ok'))
+    # 127.0.0.1 и localhost — один сервер, но для ограничителя это разные хосты
+    hosts = (f"http://127.0.0.1:{server.port}", f"http://localhost:{server.port}")
+    urls = [f"{host}/{i}" for host in hosts for i in range(6)]
+
+    started = time.monotonic()
+    with Fetcher(workers=12, rate=5, burst=1) as fetcher:
+        results = list(fetcher.map(fetcher.text, urls))
+    elapsed = time.monotonic() - started
+
+    assert all(error is None for _, _, _, error in results)
+    for host in ('127.0.0.1', 'localhost'):
+        times = sorted(r.time for r in server.requests if r.host.startswith(host))
+        assert len(times) == 6
+        # Пачка — 1 запрос, дальше не чаще 5 в секунду: 5 интервалов по 0,2 с
+        assert times[-1] - times[0] >= 0.9
+    # Хосты ограничиваются независимо, а не в общей очереди (та заняла бы больше 2 с)
+    assert elapsed < 1.8
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=20, burst=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.03
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+# В тестах повторов паузы между попытками (backoff) отключены, чтобы не ждать
+
+def test_retries_server_errors_and_then_succeeds(local_server):
+    def handle(request):
+        attempt = sum(r.path == request.path for r in server.requests)
+        if attempt < 3:
+            return 503, {'Retry-After': '0'}, 'busy'
+        return 200, {}, 'ok'
+
+    server = local_server(handle)
+    with Fetcher(rate=0) as fetcher:
+        fetcher.session.get_adapter(server.url).max_retries.backoff_factor = 0
+        assert fetcher.text(f"{server.url}/flaky") == 'ok'
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_retries(local_server):
+    server = local_server(lambda request: (503, {}, 'busy'))
+    with Fetcher(rate=0) as fetcher:
+        fetcher.session.get_adapter(server.url).max_retries.backoff_factor = 0
+        with pytest.raises(requests.exceptions.RetryError):
+            fetcher.text(f"{server.url}/down")
+    # Первая попытка и три повтора
+    assert len(server.requests) == 4
+
+
+def test_errors_are_reported_per_item(local_server):
+    def handle(request):
+        if request.path == '/missing':
+            return 404, {}, 'not found'
+        return 200, {}, request.path
+
+    server = local_server(handle)
+    urls = [f"{server.url}/a", f"{server.url}/missing", f"{server.url}/b"]
+    with Fetcher(workers=3, rate=0) as fetcher:
+        results = {i: (text, error) for i, _, text, error in fetcher.map(fetcher.text, urls)}
+
+    assert results[0] == ('/a', None)
+    assert results[2] == ('/b', None)
+    text, error = results[1]
+    assert text is None
+    assert isinstance(error, requests.HTTPError)
+    assert error.response.status_code == 404
+    # 404 не повторяется
+    assert sum(r.path == '/missing' for r in server.requests) == 1
+
+
+def test_get_raises_http_errors(local_server):
+    server = local_server(lambda request: (410, {}, 'gone'))
+    with Fetcher(rate=0) as fetcher:
+        with pytest.raises(requests.HTTPError):
+            fetcher.get(f"{server.url}/gone")
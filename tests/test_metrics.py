@@ -0,0 +1,35 @@
+"""Производные показатели (metrics.py)"""
+
+import pytest
+
+import metrics
+from dataset import UnitDataset
+from metrics import Metric, MetricTable
+
+UNITS = [
+    {'name': 'Рыцарь', 'Урон': '100', 'Кол-во целей': '1', 'Шанс попадания': '80%', 'Цена': '400'},
+    {'name': 'Лучник', 'Урон': '25', 'Кол-во целей': '1', 'Шанс попадания': '80%', 'Цена': ''},
+]
+
+
+def test_unselected_requirements_are_computed_but_hidden():
+    dataset = UnitDataset.from_units(UNITS)
+    table = MetricTable.compute(dataset, metrics.select(['Урон/100 зол.']))
+    assert [m.name for m in table] == ['Урон/100 зол.']
+    assert 'Урон/ход' not in table
+    assert table.value('Урон/100 зол.', 0) == 20.0
+    assert table.value('Урон/100 зол.', 1) is None
+
+
+def test_unknown_requirement_is_a_clear_error():
+    broken = Metric('Сломанный', '', lambda c: c['Нет такого'] * 2, requires=('Нет такого',))
+    with pytest.raises(ValueError, match='Нет такого'):
+        MetricTable.compute(UnitDataset.from_units(UNITS), (broken,))
+
+
+def test_requirements_come_before_dependents():
+    ordered = metrics.with_requirements(metrics.select(['Эфф. HP/100 зол.', 'Урон/100 зол.']))
+    names = [m.name for m in ordered]
+    assert names.index('Урон/ход') < names.index('Урон/100 зол.')
+    assert names.index('Эфф. HP') < names.index('Эфф. HP/100 зол.')
+    assert len(set(names)) == len(names)
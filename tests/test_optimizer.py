@@ -0,0 +1,25 @@
+"""Подбор отряда под бюджет (optimizer.py)"""
+
+from optimizer import SquadOptimizer
+
+# Клирик лечит всех (6 целей), послушник — одного; воин только бьёт
+UNITS = [{'name': 'Клирик'}, {'name': 'Послушник'}, {'name': 'Воин'}]
+COSTS = [250, 50, 100]
+SIZES = [1, 1, 1]
+
+
+def test_additive_objective_sums_units():
+    optimizer = SquadOptimizer(UNITS, COSTS, SIZES, [0, 0, 10])
+    value, picked = optimizer.solve(1000, 6)
+    assert (value, picked) == (60, [2] * 6)
+
+
+def test_saturating_objective_stops_at_squad_size():
+    optimizer = SquadOptimizer(UNITS, COSTS, SIZES, [6, 1, 0], saturating=True)
+    # Четыре клирика дали бы 24 — но союзников в отряде всего 6
+    value, picked = optimizer.solve(1000, 6)
+    assert value == 6
+    assert sum(COSTS[i] for i in picked) == 250
+    # Один клирик в отряде из 6 клеток нужен, пока на него хватает золота
+    assert optimizer.solve(249, 6) == (4, [1] * 4)
+    assert optimizer.solve(1000, 2)[0] == 2
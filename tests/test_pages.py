@@ -0,0 +1,44 @@
+"""Кэш готовых страниц (pages.py)"""
+
+import threading
+import time
+
+from pages import PageCache
+
+
+def test_concurrent_misses_render_once():
+    cache = PageCache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        time.sleep(0.1)
+        return 'page'
+
+    threads = [threading.Thread(target=cache.get, args=('table', 1, render)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(renders) == 1
+    assert (cache.hits, cache.misses) == (7, 1)
+
+
+def test_new_version_renders_again():
+    cache = PageCache()
+    assert cache.get('table', 1, lambda: 'v1').body == b'v1'
+    assert cache.get('table', 1, lambda: 'other').body == b'v1'
+    assert cache.get('table', 2, lambda: 'v2').body == b'v2'
+
+
+def test_fill_later_puts_page_in_background():
+    cache = PageCache()
+    cache.fill_later('table', 1, lambda: 'streamed')
+    for _ in range(100):
+        if cache.peek('table', 1) is not None:
+            break
+        time.sleep(0.01)
+    assert cache.peek('table', 1).body == b'streamed'
+    # Уже в кэше — второй раз не рендерим
+    cache.fill_later('table', 1, lambda: 1 / 0)
+    assert cache.get('table', 1, lambda: 1 / 0).body == b'streamed'
@@ -0,0 +1,120 @@
+"""
+Режим --source api (wikiapi.py, parser.scrape_units_api) на подставном
+api.php: сервер отвечает записанными ответами из fixtures/api/ и только
+на те запросы, что в них записаны.
+"""
+
+import glob
+import json
+import os
+
+import pytest
+
+import parser
+import wikiapi
+from conftest import FIXTURES
+from fetcher import Fetcher
+from wikiapi import ApiError, WikiApi
+
+RECORDED = {}
+for path in glob.glob(os.path.join(FIXTURES, 'api', '*.json')):
+    with open(path, encoding='utf-8') as f:
+        exchange = json.load(f)
+    RECORDED[tuple(sorted(exchange['params'].items()))] = exchange['response']
+
+
+def handle(request):
+    params = dict(request.params)
+    assert request.path == '/api.php'
+    assert (params.pop('format'), params.pop('formatversion')) == ('json', '2')
+    response = RECORDED.get(tuple(sorted(params.items())))
+    if response is None:
+        response = {'error': {'code': 'unrecorded', 'info': f"нет записи для {params}"}}
+    return 200, {'Content-Type': 'application/json; charset=utf-8'}, json.dumps(response)
+
+
+@pytest.fixture
+def api(local_server):
+    server = local_server(handle)
+    with Fetcher(workers=4, rate=0) as fetcher:
+        client = WikiApi(f"{server.url}/api.php", fetcher)
+        client.server = server
+        yield client
+
+
+def actions(server):
+    return [r.params['action'] for r in server.requests]
+
+
+def test_revisions_follow_normalized_titles_and_redirects(api):
+    revisions = api.revisions(['Angel/D2', 'archer/D2', 'Cleric', 'Nonexistent/D2'])
+    # Ключи — названия как в запросе; несуществующей страницы нет
+    assert revisions == {'Angel/D2': 1001, 'archer/D2': 1002, 'Cleric': 1003}
+    assert actions(api.server) == ['query']
+
+
+def test_revisions_are_requested_in_batches(api, monkeypatch):
+    monkeypatch.setattr(wikiapi, 'QUERY_BATCH', 2)
+    revisions = api.revisions(['Angel/D2', 'archer/D2', 'Cleric', 'Nonexistent/D2'])
+    assert revisions == {'Angel/D2': 1001, 'archer/D2': 1002, 'Cleric': 1003}
+    assert [r.params['titles'] for r in api.server.requests] == [
+        'Angel/D2|archer/D2', 'Cleric|Nonexistent/D2']
+
+
+def test_parse_many_splits_pages_on_markers(api):
+    pages = api.parse_many(['Angel/D2', 'Archer/D2', 'Cleric/D2'])
+    assert list(pages) == ['Angel/D2', 'Archer/D2', 'Cleric/D2']
+    assert actions(api.server) == ['parse']
+
+    angel = parser.parse_unit_html(pages['Angel/D2'], 'u', 'Angel')
+    archer = parser.parse_unit_html(pages['Archer/D2'], 'u', 'Archer')
+    cleric = parser.parse_unit_html(pages['Cleric/D2'], 'u', 'Cleric')
+    assert (angel['Здоровье'], archer['Здоровье'], cleric['Здоровье']) == ('225', '45', '75')
+    assert angel['image_url'].endswith('/Angel.png/revision/latest')
+    assert cleric['Атака'] == 'Лечение'
+    # Куски не перекрываются: на странице лучника нет ничего от соседей
+    assert 'Angel.png' not in pages['Archer/D2']
+    assert 'Cleric.png' not in pages['Archer/D2']
+
+
+def test_parse_many_matches_rendered_page(api):
+    """Тот же юнит из api.php и со страницы вики разбирается одинаково"""
+    page = api.parse_many(['Angel/D2', 'Archer/D2', 'Cleric/D2'])['Archer/D2']
+    with open(os.path.join(FIXTURES, 'pages', 'Archer_D2.html'), encoding='utf-8') as f:
+        rendered = f.read()
+    assert parser.parse_unit_html(page, 'u', 'Archer') == parser.parse_unit_html(rendered, 'u', 'Archer')
+
+
+def test_api_errors_are_raised(api):
+    with pytest.raises(ApiError, match='unrecorded'):
+        api.revisions(['Not recorded'])
+
+
+def test_scrape_units_api_skips_unchanged_revisions(local_server, monkeypatch):
+    server = local_server(handle)
+    monkeypatch.setattr(parser, 'API_URL', f"{server.url}/api.php")
+    units = [u for u in parser.get_unit_links() if u['title'] in ('Angel/D2', 'Archer/D2', 'Cleric/D2')]
+    angel, archer, cleric = units
+
+    # Ангел не менялся и уже есть в данных, у лучника новая ревизия, клирика ещё нет
+    state = {angel['url']: 'rev:1001', archer['url']: 'rev:999'}
+    known = {angel['url'], archer['url']}
+    with Fetcher(rate=0) as fetcher:
+        data = parser.scrape_units_api(units, fetcher, state, known)
+
+    assert [d['name_en'] for d in data] == ['Archer', 'Cleric']
+    assert data[0]['url'] == archer['url']
+    # Одна пачка ревизий и один action=parse только для изменившихся страниц
+    assert actions(server) == ['query', 'parse']
+    assert server.requests[1].params['text'].count('{{:') == 2
+    assert state == {angel['url']: 'rev:1001', archer['url']: 'rev:1002', cleric['url']: 'rev:1003'}
+
+
+def test_scrape_units_api_fetches_everything_without_state(local_server, monkeypatch):
+    server = local_server(handle)
+    monkeypatch.setattr(parser, 'API_URL', f"{server.url}/api.php")
+    units = [u for u in parser.get_unit_links() if u['title'] in ('Angel/D2', 'Archer/D2', 'Cleric/D2')]
+    with Fetcher(rate=0) as fetcher:
+        data = parser.scrape_units_api(units, fetcher)
+    assert [d['name_en'] for d in data] == ['Angel', 'Archer', 'Cleric']
+    assert actions(server) == ['query', 'parse']
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Собирает превью картинок юнитов для таблицы и древа:
+images/<имя>.png → images/thumbs/32/<имя>.png, images/thumbs/64/<имя>.png
+"""
+
+import os
+
+from PIL import Image
+
+from images import THUMB_SIZES, thumb_path
+
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'images')
+
+
+def fit_image(src, size):
+    """Вписать картинку в квадрат size×size с сохранением пропорций"""
+    with Image.open(src) as im:
+        im = im.convert('RGBA')
+    im.thumbnail((size, size), Image.LANCZOS)
+    return im
+
+
+def make_thumb(src, dst, size):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    fit_image(src, size).save(dst, 'PNG', optimize=True)
+
+
+def source_images(images_dir=IMAGES_DIR):
+    """Исходные картинки юнитов (без превью и атласа)"""
+    return [f for f in sorted(os.listdir(images_dir))
+            if os.path.isfile(os.path.join(images_dir, f)) and f.lower().endswith(('.png', '.gif'))]
+
+
+def build(images_dir=IMAGES_DIR, force=False):
+    """Собрать недостающие или устаревшие превью, вернуть число новых файлов"""
+    built = 0
+    for filename in source_images(images_dir):
+        src = os.path.join(images_dir, filename)
+        for size in THUMB_SIZES:
+            dst = thumb_path(images_dir, size, os.path.splitext(filename)[0] + '.png')
+            if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+                continue
+            make_thumb(src, dst, size)
+            built += 1
+    return built
+
+
+def main():
+    built = build()
+    print(f"✓ Превью собраны: {built} новых файлов в {IMAGES_DIR}/thumbs/")
+
+
+if __name__ == "__main__":
+    main()
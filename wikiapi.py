@@ -0,0 +1,88 @@
+"""
+Чтение вики через api.php MediaWiki: много страниц за один запрос.
+Ревизии берутся пачками до 50 названий (action=query&prop=revisions),
+HTML — одним action=parse на несколько страниц: в текст подставляются
+страницы целиком ({{:Название}}), между ними — пустые div-метки, по которым
+ответ режется обратно на страницы. Получается тот же HTML статьи
+(инфобокс, таблицы), что и на обычной странице вики, без шапки и рекламы.
+Запросы идут через Fetcher — с тем же ограничением частоты и кэшем.
+"""
+
+import json
+import re
+from urllib.parse import urlencode
+
+# Больше 50 названий в titles= MediaWiki без прав бота не принимает
+QUERY_BATCH = 50
+# Страниц на один action=parse: текст ответа растёт, а лимиты подстановки шаблонов — нет
+PARSE_BATCH = 25
+
+# Метка вместе с закрывающим тегом: иначе он закроет обёртку страницы
+MARKER_RE = re.compile(r'<div[^<>]*\bid="scrape-page-(\d+)"[^<>]*>\s*</div>')
+
+
+class ApiError(Exception):
+    """api.php вернул ошибку"""
+
+
+def batched(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class WikiApi:
+    """Клиент api.php поверх Fetcher"""
+
+    def __init__(self, api_url, fetcher):
+        self.api_url = api_url
+        self.fetcher = fetcher
+
+    def call(self, **params):
+        """GET-запрос к api.php, ответ — разобранный JSON"""
+        params.update(format='json', formatversion=2)
+        data = json.loads(self.fetcher.text(f"{self.api_url}?{urlencode(params)}"))
+        if 'error' in data:
+            error = data['error']
+            raise ApiError(f"{error.get('code')}: {error.get('info')}")
+        return data
+
+    def revisions(self, titles):
+        """{название: id текущей ревизии}; несуществующих страниц в ответе нет"""
+        revisions = {}
+        for batch in batched(titles, QUERY_BATCH):
+            query = self.call(action='query', prop='revisions', rvprop='ids',
+                              titles='|'.join(batch), redirects=1)['query']
+            # Название из запроса -> как его записал MediaWiki -> куда ведёт перенаправление
+            renamed = {}
+            for step in ('normalized', 'redirects'):
+                for item in query.get(step, ()):
+                    renamed[item['from']] = item['to']
+            by_title = {
+                page['title']: page['revisions'][0]['revid']
+                for page in query.get('pages', ())
+                if not page.get('missing') and page.get('revisions')
+            }
+            for title in batch:
+                final = title
+                for _ in range(len(renamed)):
+                    if final in by_title or final not in renamed:
+                        break
+                    final = renamed[final]
+                if final in by_title:
+                    revisions[title] = by_title[final]
+        return revisions
+
+    def parse_many(self, titles):
+        """{название: HTML статьи} за один action=parse"""
+        text = '\n'.join(f'<div id="scrape-page-{i}"></div>\n{{{{:{title}}}}}'
+                         for i, title in enumerate(titles))
+        html = self.call(action='parse', text=text, contentmodel='wikitext', prop='text',
+                         disablelimitreport=1, disableeditsection=1)['parse']['text']
+        markers = list(MARKER_RE.finditer(html))
+        pages = {}
+        for marker, following in zip(markers, markers[1:] + [None]):
+            end = following.start() if following else len(html)
+            # Каждую страницу оборачиваем как статью, чтобы разбор нашёл контент
+            pages[titles[int(marker.group(1))]] = (
+                f'<html><body><div class="mw-parser-output">{html[marker.end():end]}</div></body></html>')
+        return pages